@@ -1,4 +1,122 @@
+import json
+import asyncio
+import mappings.custom_tags as custom_tags
+
 class ModelAdapter:
+    def __init__(self, prompt_token_budget=3000, safety_checks_enabled=False, *args, **kwargs):
+        self.prompt_token_budget=prompt_token_budget
+        self.safety_checks_enabled=safety_checks_enabled
+        super().__init__(*args,**kwargs)
+
+    async def moderation_check(self,user_query):
+        """
+        Returns True when the query is flagged by a moderation service.
+        Adapters whose models moderate on their own leave this as False.
+        """
+        return False
+
+    def embeddings_support_batching(self):
+        """
+        Returns True when the embedding client embeds a list of texts in one
+        request, so batching concurrent query embeddings saves calls. Clients
+        that embed texts one at a time would only serialize the queries.
+        """
+        return False
+
+    async def intent_check(self,user_query):
+        """
+        Returns the JSON verdict of get_intent_system_prompt for the query.
+        """
+        raise NotImplementedError
+
+    async def safety_checks(self,user_query,prefilter=None):
+        """
+        Returns (moderation_result, intent_result) for the query.
+
+        When safety checks are disabled the checks are bypassed with safe,
+        default values. A prefilter settles clear-cut queries locally so the
+        LLM intent check only runs for the ambiguous ones.
+        """
+        if not self.safety_checks_enabled:
+            moderation_result = False
+            intent_result = json.dumps({
+                "user_intent": 0,         # No harmful user intent
+                "prompt_injection": 0,    # No prompt injection detected
+                "unrelated_topic": 0      # No unrelated topic flagged
+            })
+            return moderation_result, intent_result
+
+        async def checked_intent(user_query):
+            if prefilter is not None:
+                verdict = await prefilter.classify(user_query)
+                if verdict is not None:
+                    return json.dumps(verdict)
+            return await self.intent_check(user_query)
+
+        # Run both checks concurrently
+        moderation_result, intent_result = await asyncio.gather(
+            self.moderation_check(user_query),
+            checked_intent(user_query)
+        )
+
+        return moderation_result, intent_result
+
+    def count_tokens(self,text):
+        """
+        Estimates the number of tokens in text at roughly four characters per
+        token. Adapters with a tokenizer for their model override this.
+        """
+        return (len(text) + 3) // 4
+
+    def count_message_tokens(self,message):
+        # Role and message framing cost a few tokens on top of the content
+        return self.count_tokens(message.get("content") or "") + 4
+
+    def is_followup_request(self,message):
+        content=message.get("content") or ""
+        return message.get("role") == "user" and any(
+            content.startswith(custom_tags.tags[tag][0]) for tag in custom_tags.followup_tags
+        )
+
+    async def window_chat_history(self,chat_history,*prompt_parts):
+        """
+        Returns the most recent part of chat_history that fits in the prompt
+        token budget left after prompt_parts (system prompt, knowledge
+        context).
+
+        Synthetic follow-up turns (sources, next steps, more detail) and their
+        answers are pruned first. The latest message is always kept and the
+        window always starts with a user message.
+        """
+        messages=[]
+        skip_answer=False
+        for message in chat_history:
+            if self.is_followup_request(message):
+                skip_answer=True
+                continue
+            if skip_answer and message.get("role") == "assistant":
+                skip_answer=False
+                continue
+            skip_answer=False
+            messages.append(message)
+
+        history_budget=self.prompt_token_budget - sum(self.count_tokens(part or "") for part in prompt_parts)
+
+        window=[]
+        used_tokens=0
+        for message in reversed(messages):
+            message_tokens=self.count_message_tokens(message)
+            if window and used_tokens + message_tokens > history_budget:
+                break
+            window.append(message)
+            used_tokens+=message_tokens
+        window.reverse()
+
+        while len(window) > 1 and window[0].get("role") != "user":
+            window.pop(0)
+
+        return window
+
     async def build_message_chain_for_action(self,user_query,bot_response,inject_user_query,messages=None):
         if messages is None:
             messages = []
@@ -110,4 +228,19 @@ Adhere to the rules strictly. Non-compliance will result in termination.
 
         system_prompt=system_prompt.format(kb_data=kb_data)
         
-        return system_prompt
\ No newline at end of file
+        return system_prompt
+
+    async def generate_response_stream(self,llm_body):
+        """
+        Yields the response in text deltas as the model generates it.
+
+        Adapters without native streaming support fall back to yielding
+        the complete response as a single delta.
+        """
+        yield await self.generate_response(llm_body=llm_body)
+
+    async def warm_up(self):
+        """
+        Opens connections to the model provider ahead of the first request.
+        """
+        pass
@@ -1,14 +1,20 @@
 from .base import ModelAdapter
 import boto3
 import json
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
 from langchain_community.embeddings import BedrockEmbeddings
 import datetime
 
 class BedrockClaudeAdapter(ModelAdapter):
-    def __init__(self, model_id="anthropic.claude-3-sonnet-20240229-v1:0", region='us-east-1', *args, **kwargs):
+    def __init__(self, model_id="anthropic.claude-3-sonnet-20240229-v1:0", region='us-east-1', max_connections=20, *args, **kwargs):
         self.embeddings = BedrockEmbeddings(region_name=region)
         self.model_id=model_id
-        self.client = boto3.client('bedrock-runtime', region)
+        # boto3 has no async client; calls run on a bounded executor sized to the connection pool
+        self.client = boto3.client('bedrock-runtime', region, config=Config(max_pool_connections=max_connections))
+        self.executor = ThreadPoolExecutor(max_workers=max_connections, thread_name_prefix="bedrock")
         super().__init__(*args,**kwargs)
 
     def get_embeddings( self ):
@@ -102,7 +108,7 @@ class BedrockClaudeAdapter(ModelAdapter):
 
         
         messages=[]
-        for message in chat_history:
+        for message in await self.window_chat_history(chat_history, system_prompt):
             messages.append(message)
         
         bedrock_payload=await self.generate_llm_payload(system_prompt=system_prompt, max_tokens=max_tokens, messages=messages, temperature=temperature)
@@ -110,50 +116,61 @@ class BedrockClaudeAdapter(ModelAdapter):
 
         return bedrock_payload
 
-    async def generate_response(self,llm_body):
+    async def run_in_executor(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    def invoke_model(self, llm_body):
         accept = 'application/json'
         contentType = 'application/json'
 
         response = self.client.invoke_model(body=llm_body, modelId=self.model_id, accept=accept, contentType=contentType)
-        response_body =  json.loads(response.get('body').read())
+        return json.loads(response.get('body').read())
+
+    async def warm_up(self):
+        # bedrock-runtime has no metadata call; a one-token completion resolves credentials and opens the connection
+        bedrock_payload=await self.generate_llm_payload(system_prompt="Reply briefly.", max_tokens=1, messages=[{'role':'user','content':'Hi'}], temperature=0)
+        await self.run_in_executor(self.invoke_model, bedrock_payload)
+
+    async def generate_response(self,llm_body):
+        response_body = await self.run_in_executor(self.invoke_model, llm_body)
         response_content = response_body["content"][0]["text"]
-        
+
         return response_content
+
+    async def generate_response_stream(self,llm_body):
+        accept = 'application/json'
+        contentType = 'application/json'
+
+        response = await self.run_in_executor(
+            self.client.invoke_model_with_response_stream,
+            body=llm_body, modelId=self.model_id, accept=accept, contentType=contentType
+        )
+        events = iter(response.get('body'))
+        while True:
+            # Each read of the event stream blocks on the network, so it is offloaded as well
+            event = await self.run_in_executor(next, events, None)
+            if event is None:
+                break
+            chunk = event.get('chunk')
+            if not chunk:
+                continue
+            chunk_body = json.loads(chunk.get('bytes'))
+            if chunk_body.get("type") == "content_block_delta":
+                yield chunk_body["delta"].get("text", "")
     
-    # async def safety_checks(self, user_query):
-        # async def UserIntentCheck(user_query,temperature=.5,max_tokens=500):
-        #     system_prompt=await self.get_intent_system_prompt()
-            
-        #     messages=[]
-        #     messages.append(
-        #         {
-        #             'role':'user',
-        #             'content':user_query
-        #         }
-        #     )
-            
-        #     bedrock_payload=await self.generate_llm_payload(system_prompt=system_prompt, max_tokens=max_tokens, messages=messages, temperature=temperature)
-
-
-        #     return await self.generate_response(bedrock_payload)
-    
-        # # We skip moderation result as these are baked into
-        # # bedrock already
-        # moderation_result=False
-        # intent_result = await UserIntentCheck(user_query)
+    # Moderation is built into Bedrock, so only the intent check runs here
+    async def intent_check(self, user_query, temperature=.5, max_tokens=500):
+        system_prompt=await self.get_intent_system_prompt()
 
-        # return moderation_result,intent_result
+        messages=[]
+        messages.append(
+            {
+                'role':'user',
+                'content':user_query
+            }
+        )
 
-    async def safety_checks(self, user_query):
-        """
-        Bypass safety checks by returning safe, default values.
-        """
-        # Always return False for moderation_result (no moderation issues)
-        # Return a safe, valid JSON string for intent_result
-        moderation_result = False
-        intent_result = json.dumps({
-            "user_intent": 0,         # No harmful user intent
-            "prompt_injection": 0,    # No prompt injection detected
-            "unrelated_topic": 0      # No unrelated topic flagged
-        })
-        return moderation_result, intent_result
\ No newline at end of file
+        bedrock_payload=await self.generate_llm_payload(system_prompt=system_prompt, max_tokens=max_tokens, messages=messages, temperature=temperature)
+
+        return await self.generate_response(bedrock_payload)
@@ -1,22 +1,45 @@
 from .base import ModelAdapter
 import json
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 import re
+import tiktoken
 from langchain_openai import OpenAIEmbeddings
 from datetime import datetime
 import asyncio
 
 
 class OpenAIAdapter(ModelAdapter):
-    def __init__(self, model_id="gpt-3.5-turbo", region=None, *args, **kwargs):
+    def __init__(self, model_id="gpt-3.5-turbo", region=None, max_connections=20, *args, **kwargs):
         self.embeddings = OpenAIEmbeddings()
         self.model_id=model_id
-        self.client = OpenAI()
+        # One pooled HTTP client per adapter so keep-alive connections are reused across requests
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(60.0, connect=5.0)
+        )
+        self.client = AsyncOpenAI(http_client=self.http_client)
+        try:
+            self.encoding = tiktoken.encoding_for_model(model_id)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # tiktoken downloads its encodings on first use; estimate when that is not possible
+            print(f"Could not load tokenizer for {model_id}, estimating token counts: {e}")
+            self.encoding = None
         super().__init__(*args,**kwargs)
+
+    def count_tokens( self, text ):
+        if self.encoding is None:
+            return super().count_tokens(text)
+        return len(self.encoding.encode(text))
     
     def get_embeddings( self ):
         return self.embeddings
 
+    def embeddings_support_batching( self ):
+        return True
+
     async def generate_llm_payload(self, messages, temperature ):
         return json.dumps(
             {
@@ -125,17 +148,21 @@ class OpenAIAdapter(ModelAdapter):
                 "content":system_prompt
             }
         ]
-        for message in chat_history:
+        for message in await self.window_chat_history(chat_history, system_prompt):
             messages.append(message)
         
         openai_payload = await self.generate_llm_payload(messages=messages, temperature=temperature)
 
         return openai_payload
 
+    async def warm_up(self):
+        # A metadata call opens a pooled keep-alive connection without generating tokens
+        await self.client.models.retrieve(self.model_id)
+
     async def generate_response(self,llm_body):
         llm_body = json.loads(llm_body)
 
-        response = self.client.chat.completions.create(
+        response = await self.client.chat.completions.create(
             model=self.model_id,
             messages=llm_body["messages"],
             temperature=llm_body["temperature"],
@@ -147,62 +174,50 @@ class OpenAIAdapter(ModelAdapter):
         response_content = re.sub(r'\n', '<br>', response_body)
 
         return response_content
-    
-    # async def safety_checks(self, user_query):
-    #     async def ModerationCheck(user_query):
-    #         #print('timestamp starting moderation check: ',datetime.now().strftime(' %H:%M:%S'))
-    #         response = self.client.moderations.create(input=user_query)
-    #         moderation_output = response.results[0].flagged
-    #         #print('timestamp exiting moderation check: ',datetime.now().strftime(' %H:%M:%S'))
-    #         #print(moderation_output)
-    #         return moderation_output
-    #     async def UserIntentCheck(user_query,temperature=.5,max_tokens=512):
-    #         system_prompt=await self.get_intent_system_prompt()
-            
-    #         messages=[
-    #             {
-    #                 "role":"system",
-    #                 "content":system_prompt
-    #             }
-    #         ]
-    #         messages.append(
-    #             {
-    #                 'role':'user',
-    #                 'content':user_query
-    #             }
-    #         )
-
-            
-    #         response = self.client.chat.completions.create(
-    #             model=self.model_id,
-    #             messages=messages,
-    #             temperature=temperature,
-    #             max_tokens=max_tokens,
-    #             stream=False 
-    #         )
-
-
-    #         return response.choices[0].message.content
-    
-    #     # Run both coroutines concurrently
-    #     moderation_result, intent_result = await asyncio.gather(
-    #         ModerationCheck(user_query),
-    #         UserIntentCheck(user_query)
-    #     )
 
+    async def generate_response_stream(self,llm_body):
+        llm_body = json.loads(llm_body)
 
-    #     return moderation_result,intent_result
+        stream = await self.client.chat.completions.create(
+            model=self.model_id,
+            messages=llm_body["messages"],
+            temperature=llm_body["temperature"],
+            stream=True
+        )
 
-    async def safety_checks(self, user_query):
-        """
-        Bypass safety checks by returning safe, default values.
-        """
-        # Always return False for moderation_result (no moderation issues)
-        # Return a safe, valid JSON string for intent_result
-        moderation_result = False
-        intent_result = json.dumps({
-            "user_intent": 0,         # No harmful user intent
-            "prompt_injection": 0,    # No prompt injection detected
-            "unrelated_topic": 0      # No unrelated topic flagged
-        })
-        return moderation_result, intent_result
\ No newline at end of file
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield re.sub(r'\n', '<br>', delta)
+
+    async def moderation_check(self, user_query):
+        response = await self.client.moderations.create(input=user_query)
+        return response.results[0].flagged
+
+    async def intent_check(self, user_query, temperature=.5, max_tokens=512):
+        system_prompt=await self.get_intent_system_prompt()
+
+        messages=[
+            {
+                "role":"system",
+                "content":system_prompt
+            }
+        ]
+        messages.append(
+            {
+                'role':'user',
+                'content':user_query
+            }
+        )
+
+        response = await self.client.chat.completions.create(
+            model=self.model_id,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=False 
+        )
+
+        return response.choices[0].message.content
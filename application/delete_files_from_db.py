@@ -1,5 +1,9 @@
+import os
 from langchain.vectorstores import Chroma
 from langchain.embeddings import OpenAIEmbeddings
+from managers.flat_index import FlatIndex
+from managers.index_manifest import write_index_manifest
+from ingestion.manifest import IngestionManifest
 
 # Initialize Chroma with the correct directory and embedding function
 persist_directory = 'docs/chroma/'
@@ -22,6 +26,14 @@ def delete_documents_by_source(db, source_query):
     # Delete documents by their IDs
     db._collection.delete(ids=filtered_docs['ids'])
     print(f"Deleted {len(filtered_docs['ids'])} documents with the source: {source_query}")
+    # Forget the file so scripts/ingest.py does not count it as ingested
+    manifest = IngestionManifest(persist_directory)
+    manifest.forget(source_query)
+    manifest.save()
+    # Drop the chunks from the flat index export too, if there is one
+    FlatIndex.refresh(db._collection, os.path.join(persist_directory, "flat_index"))
+    # A new index version invalidates the app's retrieval cache
+    write_index_manifest(persist_directory, db._collection, changed_by="delete_files_from_db.py")
 
 # Example usage
 if __name__ == "__main__":
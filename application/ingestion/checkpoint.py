@@ -0,0 +1,57 @@
+import os
+import json
+import threading
+
+CHECKPOINT_FILENAME = "ingestion_checkpoint.json"
+
+class IngestionCheckpoint():
+    """
+    Page-level progress of files being streamed into a collection, kept in
+    ingestion_checkpoint.json beside it. An entry records how many leading
+    pages of a file have every chunk written and the chunk index the next
+    page starts at; it is only valid for the same file content and chunker
+    settings, and is removed once the file is complete.
+    """
+    def __init__(self, persist_directory, *args, **kwargs):
+        self.path=os.path.join(persist_directory, CHECKPOINT_FILENAME)
+        self.lock=threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.files=json.load(f)
+        except (OSError, ValueError):
+            self.files={}
+
+        super().__init__(*args,**kwargs)
+
+    def resume_point(self, source, content_hash, settings):
+        """
+        Returns (pages done, next chunk index) to resume source from.
+        """
+        with self.lock:
+            entry=self.files.get(source)
+        if entry is None or entry.get("sha256") != content_hash or entry.get("chunker") != settings:
+            return 0, 0
+        return entry["pages_done"], entry["next_chunk_index"]
+
+    def update(self, source, content_hash, settings, pages_done, next_chunk_index):
+        with self.lock:
+            self.files[source]={
+                "sha256":content_hash,
+                "chunker":settings,
+                "pages_done":pages_done,
+                "next_chunk_index":next_chunk_index
+            }
+            self.save()
+
+    def complete(self, source):
+        with self.lock:
+            if self.files.pop(source, None) is not None:
+                self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Write to a temporary file first so a crash mid-write keeps the previous checkpoint
+        tmp_path=self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.files, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
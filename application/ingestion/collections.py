@@ -0,0 +1,148 @@
+import os
+import json
+import fnmatch
+from langchain_community.vectorstores import Chroma
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.embeddings import OpenAIEmbeddings
+from managers.flat_index import FlatIndex
+from managers.lexical_index import LexicalIndex
+from managers.index_manifest import write_index_manifest
+from ingestion.manifest import IngestionManifest, chunker_settings, delete_chunks, record_results
+from ingestion.checkpoint import IngestionCheckpoint
+from ingestion.embedding_cache import CachedEmbeddings
+from ingestion.pipeline import IngestionPipeline
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "collections.json")
+
+# Settings a collection config may leave out
+COLLECTION_DEFAULTS = {
+    "language": "en",
+    "include": ["*.pdf", "*.txt"],
+    "exclude": [],
+    "chunker": {"chunk_size": 1500, "chunk_overlap": 150},
+    "embedding_model": "text-embedding-ada-002",
+    "embedding_batch_size": 100,
+    "embedding_cache": "docs/embedding_cache/",
+    "stream_threshold_mb": 16
+}
+
+def load_collection_configs(path=DEFAULT_CONFIG_PATH):
+    """
+    Returns {name: config} from a JSON file of collection configs, each
+    completed with COLLECTION_DEFAULTS.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        configs = json.load(f)
+    for name, config in configs.items():
+        for key in ("source_directory", "persist_directory"):
+            if key not in config:
+                raise ValueError(f"Collection {name} in {path} has no {key}")
+    return {name: dict(COLLECTION_DEFAULTS, **config) for name, config in configs.items()}
+
+def matches_any(relative_path, patterns):
+    file_name = relative_path.rsplit("/", 1)[-1]
+    return any(fnmatch.fnmatch(relative_path, pattern) or fnmatch.fnmatch(file_name, pattern) for pattern in patterns)
+
+def list_source_files(config):
+    """
+    Lists the files under the collection's source directory that match its
+    include patterns and none of its exclude patterns. Patterns match the
+    path relative to the source directory, or just the file name.
+    """
+    source_directory = config["source_directory"]
+    file_paths = []
+    for root, dirs, files in os.walk(source_directory):
+        for file in files:
+            file_path = os.path.join(root, file)
+            relative_path = os.path.relpath(file_path, source_directory).replace(os.sep, "/")
+            if matches_any(relative_path, config["include"]) and not matches_any(relative_path, config["exclude"]):
+                file_paths.append(file_path)
+    return sorted(file_paths)
+
+def legacy_sources(file_path):
+    posix_path = file_path.replace("\\", "/")
+    return sorted({file_path, posix_path, posix_path.replace("/", "\\")})
+
+def collection_embeddings(config):
+    embeddings = OpenAIEmbeddings(model=config["embedding_model"])
+    if config["embedding_cache"]:
+        # Chunk texts embedded before are read from the on-disk cache instead of the API
+        embeddings = CachedEmbeddings(embeddings, config["embedding_cache"])
+    return embeddings
+
+def ingest_collection(name, config, files=None, reingest=False, dry_run=False, load_workers=None, embedding_workers=4, embedding_function=None):
+    """
+    Brings one collection in step with its source files and returns a
+    report. With files, only those are ingested and nothing is removed;
+    otherwise new and changed files under the source directory are
+    ingested and the chunks of removed files deleted. reingest also
+    rewrites unchanged files.
+    """
+    persist_directory = config["persist_directory"]
+    text_splitter = RecursiveCharacterTextSplitter(**config["chunker"])
+    settings = chunker_settings(text_splitter)
+    manifest = IngestionManifest(persist_directory)
+
+    candidates = sorted(files) if files else list_source_files(config)
+    plan, _ = manifest.plan(candidates, settings, scope=None if files else config["source_directory"])
+    if files:
+        plan["removed"] = []
+    to_ingest = plan["new"] + plan["changed"] + (plan["unchanged"] if reingest else [])
+
+    print(f"{name}: {len(plan['new'])} new, {len(plan['changed'])} changed, {len(plan['removed'])} removed, "
+          f"{len(plan['unchanged'])} unchanged files -> {persist_directory}")
+    for kind in ("new", "changed", "removed"):
+        for file_path in plan[kind]:
+            print(f"  {kind}: {file_path}")
+
+    report = {
+        "collection": name,
+        "persist_directory": persist_directory,
+        "plan": {kind: len(file_paths) for kind, file_paths in plan.items()},
+        "files_to_ingest": len(to_ingest),
+        "bytes_to_ingest": sum(os.path.getsize(file_path) for file_path in to_ingest)
+    }
+    if dry_run or not (to_ingest or plan["removed"]):
+        return report
+
+    embeddings = embedding_function or collection_embeddings(config)
+    db = Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+    collection = db._collection
+    checkpoint = IngestionCheckpoint(persist_directory)
+
+    # Files ingested before the manifest existed have chunks under random ids; drop them so they are not duplicated.
+    # The existing corpus was ingested on Windows, so its sources may use either path separator.
+    # A file with a checkpoint was interrupted part-way through a previous run and resumes instead.
+    for file_path in plan["new"]:
+        if file_path not in checkpoint.files:
+            collection.delete(where={"source": {"$in": legacy_sources(file_path)}})
+
+    pipeline = IngestionPipeline(
+        collection,
+        embeddings,
+        text_splitter,
+        load_workers=load_workers,
+        embedding_workers=embedding_workers,
+        embedding_batch_size=config["embedding_batch_size"],
+        stream_threshold_bytes=int(config["stream_threshold_mb"] * 2**20),
+        checkpoint=checkpoint,
+        extra_metadata={"lang": config["language"]}
+    )
+    report.update(pipeline.run(to_ingest))
+
+    # Changed files' old chunks are deleted only once their new chunks are written
+    deleted = record_results(manifest, collection, pipeline.results, pipeline.failed_sources, settings, resumable=checkpoint.files)
+    deleted += delete_chunks(collection, [chunk for source in plan["removed"] for chunk in manifest.forget(source)])
+    manifest.save()
+    report["chunks_deleted"] = deleted
+    if isinstance(embeddings, CachedEmbeddings):
+        report["embedding_cache"] = embeddings.cache.stats()
+
+    # Keep the BM25 index, and the flat index export if there is one, in step with the collection
+    LexicalIndex.build(collection, os.path.join(persist_directory, "lexical_index"))
+    exported = FlatIndex.refresh(collection, os.path.join(persist_directory, "flat_index"))
+    if exported is not None:
+        report["flat_index_chunks"] = exported
+    # A new index version invalidates the app's retrieval cache
+    write_index_manifest(persist_directory, collection, changed_by=f"ingest.py {name}")
+    return report
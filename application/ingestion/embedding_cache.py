@@ -0,0 +1,218 @@
+import os
+import fcntl
+import struct
+import hashlib
+import threading
+import unicodedata
+import numpy as np
+from contextlib import contextmanager
+from langchain_core.embeddings import Embeddings
+
+# Index record: sha256 key, byte offset of the vector in vectors.bin, vector length
+INDEX_RECORD = struct.Struct("<32sQI")
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def cache_key(model_name, text):
+    return hashlib.sha256(f"{model_name}\n{normalize_text(text)}".encode("utf-8")).digest()
+
+def embedding_model_name(embedding_function):
+    # Vectors from different embedding models must not mix
+    return getattr(embedding_function, "model", None) or getattr(embedding_function, "model_id", None) or type(embedding_function).__name__
+
+class EmbeddingCache():
+    """
+    Append-only, on-disk store of embedding vectors keyed by
+    (embedding model, normalized chunk text).
+
+    vectors.bin holds raw float32 vectors back to back; index.bin holds one
+    fixed-size INDEX_RECORD per vector. A writer appends the vector before
+    its index record, under an exclusive flock on the lock file, so readers
+    do not take the lock to look vectors up: they only ever see complete
+    index records, and every indexed vector is already on disk. gc()
+    rewrites both files and swaps them in; readers keep serving from the
+    old pair and reopen the new one, under a shared lock, on their next miss.
+    """
+    def __init__(self, directory, *args, **kwargs):
+        self.directory=directory
+        os.makedirs(directory, exist_ok=True)
+        self.index_path=os.path.join(directory, "index.bin")
+        self.vectors_path=os.path.join(directory, "vectors.bin")
+        self.lock_path=os.path.join(directory, "lock")
+
+        self.lock=threading.Lock()
+        self.offsets={}
+        self.index_fd=None
+        self.index_size=0
+        self.vectors_fd=None
+        self.hits=0
+        self.misses=0
+
+        with self.lock:
+            self.refresh()
+
+        super().__init__(*args,**kwargs)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @contextmanager
+    def locked(self, operation=fcntl.LOCK_EX):
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def reopen(self):
+        with self.locked(fcntl.LOCK_SH):
+            for path in (self.index_path, self.vectors_path):
+                open(path, "ab").close()
+            for fd in (self.index_fd, self.vectors_fd):
+                if fd is not None:
+                    os.close(fd)
+            # gc() cannot swap the files while the shared lock is held, so the two match
+            self.index_fd=os.open(self.index_path, os.O_RDONLY)
+            self.vectors_fd=os.open(self.vectors_path, os.O_RDONLY)
+        self.index_size=0
+        self.offsets={}
+
+    def refresh(self):
+        """
+        Reads index records appended since the last call, reopening both
+        files if gc() replaced them. Call with self.lock held.
+        """
+        try:
+            replaced=self.index_fd is None or os.stat(self.index_path).st_ino != os.fstat(self.index_fd).st_ino
+        except FileNotFoundError:
+            replaced=True
+        if replaced:
+            self.reopen()
+
+        # Only whole records; a record being appended right now is picked up next time
+        size=os.fstat(self.index_fd).st_size
+        end=size - size % INDEX_RECORD.size
+        if end <= self.index_size:
+            return
+        data=os.pread(self.index_fd, end - self.index_size, self.index_size)
+        for key, offset, length in INDEX_RECORD.iter_unpack(data):
+            self.offsets[key]=(offset, length)
+        self.index_size=end
+
+    def get(self, key):
+        with self.lock:
+            location=self.offsets.get(key)
+            if location is None:
+                self.refresh()
+                location=self.offsets.get(key)
+            if location is None:
+                return None
+            offset, length = location
+            data=os.pread(self.vectors_fd, length * 4, offset)
+        return np.frombuffer(data, dtype=np.float32)
+
+    def put_many(self, items):
+        """
+        Appends [(key, vector)] to the store.
+        """
+        if not items:
+            return
+        with self.lock:
+            with self.locked(), open(self.vectors_path, "ab") as vectors_file, open(self.index_path, "ab") as index_file:
+                offset=vectors_file.seek(0, os.SEEK_END)
+                records=[]
+                for key, vector in items:
+                    data=np.asarray(vector, dtype=np.float32).tobytes()
+                    vectors_file.write(data)
+                    records.append(INDEX_RECORD.pack(key, offset, len(data) // 4))
+                    offset+=len(data)
+                # Vectors reach the file before the index records that point at them
+                vectors_file.flush()
+                os.fsync(vectors_file.fileno())
+                index_file.write(b"".join(records))
+            # Outside the exclusive lock, which a reopen's shared lock would wait on
+            self.refresh()
+
+    def gc(self, keep):
+        """
+        Rewrites the store keeping only the keys in keep. Returns
+        (entries kept, entries dropped, bytes reclaimed).
+        """
+        with self.lock:
+            with self.locked():
+                # Read the files by path under the lock; they may have grown or been swapped since we opened them
+                with open(self.index_path, "rb") as f:
+                    data=f.read()
+                offsets={}
+                for key, offset, length in INDEX_RECORD.iter_unpack(data[:len(data) - len(data) % INDEX_RECORD.size]):
+                    offsets[key]=(offset, length)
+
+                before=os.path.getsize(self.vectors_path) + len(data)
+                kept=0
+                with open(self.vectors_path, "rb") as old_vectors, open(self.vectors_path + ".tmp", "wb") as vectors_file, open(self.index_path + ".tmp", "wb") as index_file:
+                    offset=0
+                    for key, (old_offset, length) in offsets.items():
+                        if key not in keep:
+                            continue
+                        vector=os.pread(old_vectors.fileno(), length * 4, old_offset)
+                        vectors_file.write(vector)
+                        index_file.write(INDEX_RECORD.pack(key, offset, length))
+                        offset+=len(vector)
+                        kept+=1
+                    vectors_file.flush()
+                    os.fsync(vectors_file.fileno())
+                # Readers keep both old files open until they see the new index
+                os.replace(self.vectors_path + ".tmp", self.vectors_path)
+                os.replace(self.index_path + ".tmp", self.index_path)
+                after=os.path.getsize(self.vectors_path) + os.path.getsize(self.index_path)
+            # Reopen outside the exclusive lock, which the reopen's shared lock would wait on
+            self.refresh()
+        return kept, len(offsets) - kept, before - after
+
+    def stats(self):
+        return {
+            "entries":len(self.offsets),
+            "hits":self.hits,
+            "misses":self.misses,
+            "bytes":os.path.getsize(self.vectors_path) + os.path.getsize(self.index_path)
+        }
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding function so chunk texts embedded before, by the same
+    model, are read from an EmbeddingCache instead of sent to the API.
+    Queries are passed through uncached.
+    """
+    def __init__(self, embedding_function, cache_directory, *args, **kwargs):
+        self.embedding_function=embedding_function
+        self.model_name=embedding_model_name(embedding_function)
+        self.cache=EmbeddingCache(cache_directory)
+
+        super().__init__(*args,**kwargs)
+
+    def embed_documents(self, texts):
+        keys=[cache_key(self.model_name, text) for text in texts]
+        vectors=[self.cache.get(key) for key in keys]
+
+        # Embed each missing text once, even if the batch repeats it
+        missing={}
+        for position, (key, vector) in enumerate(zip(keys, vectors)):
+            if vector is None:
+                missing.setdefault(key, []).append(position)
+        self.cache.hits+=len(texts) - sum(len(positions) for positions in missing.values())
+        self.cache.misses+=len(missing)
+
+        if missing:
+            missing_keys=list(missing)
+            embedded=self.embedding_function.embed_documents([texts[missing[key][0]] for key in missing_keys])
+            self.cache.put_many(list(zip(missing_keys, embedded)))
+            for key, vector in zip(missing_keys, embedded):
+                for position in missing[key]:
+                    vectors[position]=np.asarray(vector, dtype=np.float32)
+
+        return [vector.tolist() for vector in vectors]
+
+    def embed_query(self, text):
+        return self.embedding_function.embed_query(text)
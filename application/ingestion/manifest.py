@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+import datetime
+
+MANIFEST_FILENAME = "ingestion_manifest.json"
+
+def file_hash(file_path, block_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def chunker_settings(text_splitter):
+    """
+    Returns the settings that decide how text_splitter cuts a file; a file
+    split with other settings has to be re-ingested.
+    """
+    return {
+        "splitter": type(text_splitter).__name__,
+        "chunk_size": getattr(text_splitter, "_chunk_size", None),
+        "chunk_overlap": getattr(text_splitter, "_chunk_overlap", None)
+    }
+
+def chunk_id(source, content_hash, settings, index):
+    """
+    Chunk ids follow from the file's path and content and the chunker
+    settings, so ingesting an unchanged file again rewrites the same ids
+    instead of adding duplicates.
+    """
+    key = json.dumps([source, content_hash, settings, index], sort_keys=True)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+class IngestionManifest():
+    """
+    Records, per source file ingested into a persist directory, its content
+    hash, the chunker settings and the ids of its chunks, in
+    ingestion_manifest.json beside the collection.
+    """
+    def __init__(self, persist_directory, *args, **kwargs):
+        self.persist_directory=persist_directory
+        self.path=os.path.join(persist_directory, MANIFEST_FILENAME)
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.files=json.load(f).get("files", {})
+        except (OSError, ValueError):
+            self.files={}
+
+        super().__init__(*args,**kwargs)
+
+    def plan(self, file_paths, settings, scope=None):
+        """
+        Sorts file_paths into new, changed and unchanged files, and lists
+        the recorded files under scope (a directory) that no longer exist.
+        Returns ({"new", "changed", "unchanged", "removed"}, {path: hash}).
+        """
+        plan={"new":[], "changed":[], "unchanged":[], "removed":[]}
+        hashes={}
+        for file_path in file_paths:
+            hashes[file_path]=file_hash(file_path)
+            entry=self.files.get(file_path)
+            if entry is None:
+                plan["new"].append(file_path)
+            elif entry.get("sha256") != hashes[file_path] or entry.get("chunker") != settings:
+                plan["changed"].append(file_path)
+            else:
+                plan["unchanged"].append(file_path)
+
+        present=set(file_paths)
+        prefix=os.path.join(scope, "") if scope else ""
+        plan["removed"]=sorted(
+            source for source in self.files
+            if source not in present and source.startswith(prefix)
+        )
+        return plan, hashes
+
+    def chunk_ids(self, source):
+        return self.files.get(source, {}).get("chunk_ids", [])
+
+    def record(self, source, content_hash, settings, chunk_ids):
+        """
+        Records a successful ingestion of source and returns the ids of its
+        previous chunks that the new ones replace.
+        """
+        stale=set(self.chunk_ids(source)) - set(chunk_ids)
+        self.files[source]={
+            "sha256":content_hash,
+            "chunker":settings,
+            "chunk_ids":list(chunk_ids),
+            "ingested_at":datetime.datetime.utcnow().isoformat() + "Z"
+        }
+        return sorted(stale)
+
+    def forget(self, source):
+        """
+        Drops source from the manifest and returns the ids of its chunks.
+        """
+        return self.files.pop(source, {}).get("chunk_ids", [])
+
+    def save(self):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        # Write to a temporary file first so an interrupted run keeps the previous manifest
+        tmp_path=self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"files":self.files}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+def delete_chunks(collection, chunk_ids, batch_size=5000):
+    chunk_ids=list(chunk_ids)
+    for start in range(0, len(chunk_ids), batch_size):
+        collection.delete(ids=chunk_ids[start:start + batch_size])
+    return len(chunk_ids)
+
+def record_results(manifest, collection, results, failed_sources, settings, resumable=()):
+    """
+    Records what a pipeline run wrote into the manifest and deletes the
+    chunks it superseded. A file that failed part-way keeps its previous
+    entry and chunks, its partial new chunks are removed unless it is
+    resumable (has a streaming checkpoint), and the next sync retries it.
+    Returns the number of chunks deleted.
+    """
+    stale=[]
+    for source, result in results.items():
+        if source in failed_sources and source in resumable:
+            continue
+        if source in failed_sources:
+            previous=set(manifest.chunk_ids(source))
+            stale.extend(chunk for chunk in result["chunk_ids"] if chunk not in previous)
+        else:
+            stale.extend(manifest.record(source, result["content_hash"], settings, result["chunk_ids"]))
+    return delete_chunks(collection, stale)
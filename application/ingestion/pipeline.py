@@ -0,0 +1,458 @@
+import os
+import re
+import time
+import queue
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from langchain_community.document_loaders import TextLoader, PyPDFLoader
+from ingestion.manifest import file_hash, chunker_settings, chunk_id
+
+def is_supported(file_path):
+    return bool(re.match(r".*\.(pdf|txt)$", file_path, re.IGNORECASE))
+
+def load_file(file_path):
+    """
+    Extracts the pages of a PDF or text file as Documents carrying the
+    metadata the ingestion scripts have always written. Runs in a worker
+    process; returns (content hash, pages).
+    """
+    content_hash = file_hash(file_path)
+    if re.match(r".*\.txt$", file_path, re.IGNORECASE):
+        loader = TextLoader(file_path, encoding='utf-8')
+    else:
+        loader = PyPDFLoader(file_path)
+
+    data = loader.load()
+    file_name = os.path.basename(file_path)
+    for doc in data:
+        doc.metadata['source'] = file_path
+        doc.metadata['name'] = file_name
+    return content_hash, data
+
+def is_rate_limit(error):
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or "RateLimit" in type(error).__name__
+
+def retry_after(error):
+    """
+    Returns the Retry-After delay in seconds sent with error, if any.
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class IngestionStats():
+    """
+    Thread-safe counters for each pipeline stage.
+    """
+    def __init__(self, *args, **kwargs):
+        self.lock=threading.Lock()
+        self.started=time.monotonic()
+        self.counts={
+            "files_total":0,
+            "files_loaded":0,
+            "files_failed":0,
+            "files_skipped":0,
+            "pages":0,
+            "chunks_split":0,
+            "chunks_embedded":0,
+            "chunks_written":0,
+            "chunks_failed":0,
+            "embedding_retries":0,
+            "rate_limited":0
+        }
+        self.failures=[]
+
+        super().__init__(*args,**kwargs)
+
+    def add(self, name, amount=1):
+        with self.lock:
+            self.counts[name]+=amount
+
+    def fail(self, stage, item, error):
+        with self.lock:
+            self.failures.append({"stage":stage, "item":item, "error":f"{type(error).__name__}: {error}"})
+
+    def report(self):
+        with self.lock:
+            elapsed=time.monotonic() - self.started
+            report=dict(self.counts)
+            report["elapsed_seconds"]=round(elapsed, 1)
+            report["files_per_second"]=round(report["files_loaded"] / elapsed, 2) if elapsed else 0.0
+            report["chunks_per_second"]=round(report["chunks_written"] / elapsed, 2) if elapsed else 0.0
+            report["failures"]=list(self.failures)
+            return report
+
+    def progress_line(self):
+        report=self.report()
+        return (f"[{report['elapsed_seconds']:.0f}s] files {report['files_loaded']}/{report['files_total']} loaded "
+                f"({report['files_failed']} failed, {report['files_skipped']} skipped), chunks {report['chunks_split']} split, "
+                f"{report['chunks_embedded']} embedded, {report['chunks_written']} written, "
+                f"{report['chunks_per_second']} chunks/s")
+
+class IngestionPipeline():
+    """
+    Loads, splits, embeds and stores files in a Chroma collection as
+    overlapping stages linked by bounded queues:
+
+        process pool (extract pages) -> splitter thread -> embedding threads -> writer
+
+    Extraction of one file never waits for embedding of another, a file
+    that fails to load is reported and skipped, and only the calling thread
+    writes to the collection. Each queue holds at most queue_size items, so
+    memory stays bounded however many files are ingested.
+
+    PDFs of stream_threshold_bytes or more skip the process pool: a stream
+    thread reads them a page at a time and feeds the embedding queue
+    directly, so no whole document is held in memory. With a checkpoint,
+    every page whose chunks are all written is recorded, and an interrupted
+    file resumes after its last complete page.
+    """
+    def __init__(self, collection, embedding_function, text_splitter, load_workers=None, embedding_workers=4, embedding_batch_size=100, queue_size=8, max_retries=6, progress_interval=10, stream_threshold_bytes=None, checkpoint=None, extra_metadata=None, *args, **kwargs):
+        self.collection=collection
+        self.embedding_function=embedding_function
+        self.text_splitter=text_splitter
+        self.load_workers=load_workers or os.cpu_count() or 1
+        self.embedding_workers=embedding_workers
+        self.embedding_batch_size=embedding_batch_size
+        self.queue_size=queue_size
+        self.max_retries=max_retries
+        self.progress_interval=progress_interval
+        self.stream_threshold_bytes=stream_threshold_bytes
+        self.checkpoint=checkpoint
+        # Added to every chunk's metadata, e.g. {"lang": "es"}
+        self.extra_metadata=extra_metadata or {}
+
+        # Set by an embedding thread that was rate limited; every thread waits until then
+        self.paused_until=0.0
+        self.pause_lock=threading.Lock()
+
+        self.stats=IngestionStats()
+        # Chunk ids derive from the file's content and these settings
+        self.settings=chunker_settings(text_splitter)
+        # Per source: its content hash and the ids of the chunks written so far
+        self.results={}
+        # Sources with a chunk that failed to load, embed or write
+        self.failed_sources=set()
+
+        # Page progress of streamed files: per source, pages done, chunk counts of split pages and chunks written per page
+        self.streams={}
+        # Streamed chunks not yet written, by chunk id: (source, page number)
+        self.chunk_pages={}
+        self.stream_lock=threading.Lock()
+
+        # The split and stream stages both feed the embedding queue; the last to finish closes it
+        self.producers_left=2
+        self.producers_lock=threading.Lock()
+
+        super().__init__(*args,**kwargs)
+
+    def is_streamed(self, file_path):
+        return (
+            self.stream_threshold_bytes is not None
+            and re.match(r".*\.pdf$", file_path, re.IGNORECASE) is not None
+            and os.path.getsize(file_path) >= self.stream_threshold_bytes
+        )
+
+    def finish_producer(self, batches):
+        with self.producers_lock:
+            self.producers_left-=1
+            last=self.producers_left == 0
+        if last:
+            for _ in range(self.embedding_workers):
+                batches.put(None)
+
+    def load_stage(self, file_paths, loaded):
+        try:
+            with ProcessPoolExecutor(max_workers=self.load_workers) as pool:
+                pending={}
+                paths=iter(file_paths)
+                while True:
+                    # Keep a couple of files per worker in flight, never the whole corpus
+                    while len(pending) < self.load_workers * 2:
+                        file_path=next(paths, None)
+                        if file_path is None:
+                            break
+                        pending[pool.submit(load_file, file_path)]=file_path
+                    if not pending:
+                        break
+
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        file_path=pending.pop(future)
+                        try:
+                            content_hash, pages = future.result()
+                        except Exception as e:
+                            self.failed_sources.add(file_path)
+                            self.stats.add("files_failed")
+                            self.stats.fail("load", file_path, e)
+                            print(f"Failed to load {file_path}: {e}")
+                            continue
+                        self.stats.add("files_loaded")
+                        self.stats.add("pages", len(pages))
+                        loaded.put((file_path, content_hash, pages))
+        finally:
+            loaded.put(None)
+
+    def split_file(self, file_path, content_hash, pages):
+        chunks=[]
+        for page in pages:
+            for chunk in self.text_splitter.split_documents([page]):
+                chunk.metadata=dict(page.metadata, **self.extra_metadata)
+                chunk.metadata['id']=chunk_id(file_path, content_hash, self.settings, len(chunks))
+                chunks.append(chunk)
+        return chunks
+
+    def split_stage(self, loaded, batches):
+        try:
+            batch=[]
+            while True:
+                item=loaded.get()
+                if item is None:
+                    break
+                file_path, content_hash, pages = item
+                # A file is split whole before any of its chunks are queued, so a failure leaves none behind
+                try:
+                    chunks=self.split_file(file_path, content_hash, pages)
+                except Exception as e:
+                    self.failed_sources.add(file_path)
+                    self.stats.add("files_failed")
+                    self.stats.fail("split", file_path, e)
+                    print(f"Failed to split {file_path}: {e}")
+                    continue
+                self.results[file_path]={"content_hash":content_hash, "chunk_ids":[]}
+                for chunk in chunks:
+                    batch.append(chunk)
+                    if len(batch) >= self.embedding_batch_size:
+                        self.stats.add("chunks_split", len(batch))
+                        batches.put(batch)
+                        batch=[]
+            if batch:
+                self.stats.add("chunks_split", len(batch))
+                batches.put(batch)
+        finally:
+            self.finish_producer(batches)
+
+    def advance_stream(self, source):
+        """
+        Moves the checkpoint of source past every leading page whose chunks
+        are all written. Call with stream_lock held.
+        """
+        stream=self.streams[source]
+        next_chunk_index=None
+        while stream["pages_done"] in stream["pages"]:
+            page_number=stream["pages_done"]
+            count, end_index = stream["pages"][page_number]
+            if stream["written"][page_number] < count:
+                break
+            del stream["pages"][page_number]
+            stream["written"].pop(page_number, None)
+            stream["pages_done"]+=1
+            next_chunk_index=end_index
+
+        if next_chunk_index is not None and self.checkpoint is not None:
+            self.checkpoint.update(source, stream["content_hash"], self.settings, stream["pages_done"], next_chunk_index)
+
+    def page_split(self, source, page_number, count, end_index):
+        with self.stream_lock:
+            self.streams[source]["pages"][page_number]=(count, end_index)
+            self.advance_stream(source)
+
+    def streamed_chunks_done(self, batch, written):
+        with self.stream_lock:
+            sources=set()
+            for chunk in batch:
+                location=self.chunk_pages.pop(chunk.metadata['id'], None)
+                if location is not None and written:
+                    source, page_number = location
+                    self.streams[source]["written"][page_number]+=1
+                    sources.add(source)
+            for source in sources:
+                self.advance_stream(source)
+
+    def stream_file(self, file_path, batches):
+        """
+        Splits file_path a page at a time into batches, starting after the
+        pages its checkpoint records as done. The last batch is queued only
+        once the whole file has been read; if reading fails, its chunks are
+        dropped and the checkpoint stays before their pages.
+        """
+        content_hash=file_hash(file_path)
+        pages_done, index = self.checkpoint.resume_point(file_path, content_hash, self.settings) if self.checkpoint is not None else (0, 0)
+        if pages_done:
+            print(f"Resuming {file_path} after page {pages_done}")
+        self.results[file_path]={
+            "content_hash":content_hash,
+            "chunk_ids":[chunk_id(file_path, content_hash, self.settings, i) for i in range(index)]
+        }
+        with self.stream_lock:
+            self.streams[file_path]={"content_hash":content_hash, "pages_done":pages_done, "pages":{}, "written":Counter()}
+
+        file_name=os.path.basename(file_path)
+        batch=[]
+        # lazy_load still extracts the text of pages already done; it is embedding them that resuming saves
+        for page_number, page in enumerate(PyPDFLoader(file_path).lazy_load()):
+            if page_number < pages_done:
+                continue
+            page.metadata['source']=file_path
+            page.metadata['name']=file_name
+
+            chunks=self.text_splitter.split_documents([page])
+            for chunk in chunks:
+                chunk.metadata=dict(page.metadata, **self.extra_metadata)
+                chunk.metadata['id']=chunk_id(file_path, content_hash, self.settings, index)
+                index+=1
+                with self.stream_lock:
+                    self.chunk_pages[chunk.metadata['id']]=(file_path, page_number)
+            self.stats.add("pages")
+            self.page_split(file_path, page_number, len(chunks), index)
+
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= self.embedding_batch_size:
+                    self.stats.add("chunks_split", len(batch))
+                    batches.put(batch)
+                    batch=[]
+
+        if batch:
+            self.stats.add("chunks_split", len(batch))
+            batches.put(batch)
+        self.stats.add("files_loaded")
+
+    def stream_stage(self, file_paths, batches):
+        try:
+            for file_path in file_paths:
+                try:
+                    self.stream_file(file_path, batches)
+                except Exception as e:
+                    self.failed_sources.add(file_path)
+                    self.stats.add("files_failed")
+                    self.stats.fail("load", file_path, e)
+                    print(f"Failed to stream {file_path}: {e}")
+        finally:
+            self.finish_producer(batches)
+
+    def wait_if_paused(self):
+        delay=self.paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def embed_with_backoff(self, texts):
+        """
+        Embeds texts, retrying failures with exponential backoff and jitter.
+        A rate limit pauses every embedding thread, for the server's
+        Retry-After when it sends one.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.wait_if_paused()
+            try:
+                return self.embedding_function.embed_documents(texts)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay=min(60.0, 2 ** attempt) * (0.5 + random.random())
+                if is_rate_limit(e):
+                    self.stats.add("rate_limited")
+                    delay=retry_after(e) or delay
+                    with self.pause_lock:
+                        self.paused_until=max(self.paused_until, time.monotonic() + delay)
+                self.stats.add("embedding_retries")
+                print(f"Embedding batch of {len(texts)} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def embed_stage(self, batches, embedded):
+        try:
+            while True:
+                batch=batches.get()
+                if batch is None:
+                    break
+                try:
+                    vectors=self.embed_with_backoff([chunk.page_content for chunk in batch])
+                except Exception as e:
+                    self.fail_batch("embed", batch, e)
+                    print(f"Failed to embed {len(batch)} chunks: {e}")
+                    continue
+                self.stats.add("chunks_embedded", len(batch))
+                embedded.put((batch, vectors))
+        finally:
+            embedded.put(None)
+
+    def fail_batch(self, stage, batch, error):
+        sources=sorted({chunk.metadata['source'] for chunk in batch})
+        self.failed_sources.update(sources)
+        self.streamed_chunks_done(batch, written=False)
+        self.stats.add("chunks_failed", len(batch))
+        self.stats.fail(stage, sources, error)
+
+    def write(self, batch, vectors):
+        self.collection.upsert(
+            ids=[chunk.metadata['id'] for chunk in batch],
+            embeddings=vectors,
+            documents=[chunk.page_content for chunk in batch],
+            metadatas=[chunk.metadata for chunk in batch]
+        )
+
+    def run(self, file_paths):
+        """
+        Ingests file_paths and returns the stats report.
+        """
+        file_paths=list(file_paths)
+        self.stats.add("files_total", len(file_paths))
+        supported=[file_path for file_path in file_paths if is_supported(file_path)]
+        self.stats.add("files_skipped", len(file_paths) - len(supported))
+        streamed=set(file_path for file_path in supported if self.is_streamed(file_path))
+        pooled=[file_path for file_path in supported if file_path not in streamed]
+
+        loaded=queue.Queue(maxsize=self.queue_size)
+        batches=queue.Queue(maxsize=self.queue_size)
+        embedded=queue.Queue(maxsize=self.queue_size)
+
+        threads=[
+            threading.Thread(target=self.load_stage, args=(pooled, loaded), daemon=True),
+            threading.Thread(target=self.split_stage, args=(loaded, batches), daemon=True),
+            threading.Thread(target=self.stream_stage, args=(sorted(streamed), batches), daemon=True)
+        ] + [
+            threading.Thread(target=self.embed_stage, args=(batches, embedded), daemon=True)
+            for _ in range(self.embedding_workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # The writer runs here, so the collection only ever sees one writer
+        finished_embedders=0
+        last_progress=time.monotonic()
+        while finished_embedders < self.embedding_workers:
+            try:
+                item=embedded.get(timeout=1)
+            except queue.Empty:
+                item=False
+            if item is None:
+                finished_embedders+=1
+            elif item:
+                batch, vectors = item
+                try:
+                    self.write(batch, vectors)
+                    self.stats.add("chunks_written", len(batch))
+                    for chunk in batch:
+                        self.results[chunk.metadata['source']]["chunk_ids"].append(chunk.metadata['id'])
+                    self.streamed_chunks_done(batch, written=True)
+                except Exception as e:
+                    self.fail_batch("write", batch, e)
+                    print(f"Failed to write {len(batch)} chunks: {e}")
+
+            if time.monotonic() - last_progress >= self.progress_interval:
+                print(self.stats.progress_line())
+                last_progress=time.monotonic()
+
+        for thread in threads:
+            thread.join()
+        if self.checkpoint is not None:
+            for source in self.streams:
+                if source not in self.failed_sources:
+                    self.checkpoint.complete(source)
+        print(self.stats.progress_line())
+        return self.stats.report()
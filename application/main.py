@@ -12,7 +12,7 @@ import mappings.custom_tags as custom_tags
 from fastapi import FastAPI, BackgroundTasks
 from fastapi import Request, Form
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi import WebSocket
 
@@ -20,6 +20,14 @@ from managers.memory_manager import MemoryManager
 from managers.dynamodb_manager import DynamoDBManager
 from managers.chroma_manager import ChromaManager
 from managers.s3_manager import S3Manager
+from managers.semantic_cache_manager import SemanticCacheManager
+from managers.result_cache_manager import ResultCacheManager
+from managers.request_coalescer import RequestCoalescer
+from managers.context_packer import ContextPacker
+from managers.safety_prefilter import SafetyPrefilter
+from managers.embedding_manager import EmbeddingManager
+from managers.embedding_batcher import EmbeddingBatcher
+from managers.adaptive_top_k import AdaptiveTopK
 
 from adapters.claude import BedrockClaudeAdapter
 from adapters.openai import OpenAIAdapter
@@ -29,7 +37,7 @@ from amazon_transcribe.handlers import TranscriptResultStreamHandler
 from amazon_transcribe.model import TranscriptEvent
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.websockets import WebSocketState
-from langdetect import detect, DetectorFactory
+from langdetect import detect, detect_langs, DetectorFactory
 
 import asyncio
 
@@ -37,6 +45,7 @@ from dotenv import load_dotenv
 
 import os
 import json
+import time
 import datetime
 from starlette.middleware.base import BaseHTTPMiddleware
 
@@ -64,6 +73,19 @@ def detect_language(text):
         logging.error(f"Language detection failed: {str(e)}")
         return None
 
+def detect_language_with_confidence(text):
+    """
+    Returns (language, probability) of the most likely language, or
+    (None, 0.0) when detection fails.
+    """
+    try:
+        best = detect_langs(text)[0]
+        logging.info(f"Detected language: {best.lang} ({best.prob:.2f})")
+        return best.lang, best.prob
+    except Exception as e:
+        logging.error(f"Language detection failed: {str(e)}")
+        return None, 0.0
+
 # Set the cookie name to match the one configured in the CDK
 COOKIE_NAME = "WATERBOT"
 
@@ -167,12 +189,49 @@ app.add_middleware(SessionMiddleware, secret_key=secret_key)
 
 MESSAGES_TABLE=os.getenv("MESSAGES_TABLE")
 TRANSCRIPT_BUCKET_NAME=os.getenv("TRANSCRIPT_BUCKET_NAME")
+LLM_MAX_CONNECTIONS=int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+# Token budget for the chat prompt; history is windowed to what the system prompt leaves over
+PROMPT_TOKEN_BUDGET=int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+# Moderation and intent checks are bypassed unless enabled
+SAFETY_CHECKS_ENABLED=os.getenv("SAFETY_CHECKS_ENABLED", "false").lower() == "true"
+# Local topic/injection screening in front of the LLM intent check; only used when safety checks are enabled.
+# Off by default: the topic thresholds below have not been calibrated against real queries yet
+SAFETY_PREFILTER_ENABLED=os.getenv("SAFETY_PREFILTER_ENABLED", "false").lower() == "true"
+SAFETY_UNRELATED_THRESHOLD=float(os.getenv("SAFETY_UNRELATED_THRESHOLD", "0.75"))
+SAFETY_RELATED_THRESHOLD=float(os.getenv("SAFETY_RELATED_THRESHOLD", "0.82"))
+# "chroma" searches the Chroma collections; "flat" searches their exported matrices (scripts/export_flat_index.py)
+RETRIEVAL_BACKEND=os.getenv("RETRIEVAL_BACKEND", "chroma")
+# With a float16/int8 flat index, re-rank this many candidates with the full-precision embeddings (0 disables)
+FLAT_INDEX_RESCORE_CANDIDATES=int(os.getenv("FLAT_INDEX_RESCORE_CANDIDATES", "0"))
+# "vector" ranks chunks by embedding distance; "hybrid" fuses it with BM25 (scripts/build_lexical_index.py)
+RETRIEVAL_MODE=os.getenv("RETRIEVAL_MODE", "vector")
+# One collection holding both languages, tagged with "lang" (scripts/merge_collections.py)
+UNIFIED_INDEX_ENABLED=os.getenv("UNIFIED_INDEX_ENABLED", "false").lower() == "true"
+UNIFIED_INDEX_DIRECTORY=os.getenv("UNIFIED_INDEX_DIRECTORY", "docs/chroma_unified/")
+# Below this language detection probability the unified index is searched in every language
+LANGUAGE_CONFIDENCE_THRESHOLD=float(os.getenv("LANGUAGE_CONFIDENCE_THRESHOLD", "0.9"))
+# Retrieved chunk count follows relevance: RETRIEVAL_<SETTING> applies to both languages, RETRIEVAL_<SETTING>_EN/_ES override it
+ADAPTIVE_TOP_K_ENABLED=os.getenv("ADAPTIVE_TOP_K_ENABLED", "true").lower() == "true"
+# Chunk ids of recent searches, invalidated when an ingestion script rewrites the index manifest (0 disables)
+RETRIEVAL_CACHE_MAX_ENTRIES=int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", "1000"))
+
+def retrieval_setting(name, language, default):
+    return os.getenv(f"RETRIEVAL_{name}_{language.upper()}") or os.getenv(f"RETRIEVAL_{name}", default)
+
+# Token budget for the retrieved knowledge context
+KB_TOKEN_BUDGET=int(os.getenv("KB_TOKEN_BUDGET", "1500"))
+
+ADAPTER_OPTIONS = {
+    "max_connections":LLM_MAX_CONNECTIONS,
+    "prompt_token_budget":PROMPT_TOKEN_BUDGET,
+    "safety_checks_enabled":SAFETY_CHECKS_ENABLED
+}
 
 # adapter choices
 ADAPTERS = {
-    "claude.haiku":BedrockClaudeAdapter("anthropic.claude-3-haiku-20240307-v1:0"),
-    "claude.":BedrockClaudeAdapter("anthropic.claude-3-sonnet-20240229-v1:0"),
-    "openai-gpt3.5":OpenAIAdapter("gpt-3.5-turbo")
+    "claude.haiku":BedrockClaudeAdapter("anthropic.claude-3-haiku-20240307-v1:0", **ADAPTER_OPTIONS),
+    "claude.":BedrockClaudeAdapter("anthropic.claude-3-sonnet-20240229-v1:0", **ADAPTER_OPTIONS),
+    "openai-gpt3.5":OpenAIAdapter("gpt-3.5-turbo", **ADAPTER_OPTIONS)
 }
 
 # Set adapter choice
@@ -181,12 +240,127 @@ llm_adapter=ADAPTERS["openai-gpt3.5"]
 
 embeddings = llm_adapter.get_embeddings()
 
+# Query embeddings shared across retrieval, the semantic cache and the safety prefilter
+EMBEDDING_CACHE_MAX_ENTRIES=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "2048"))
+EMBEDDING_CACHE_PATH=os.getenv("EMBEDDING_CACHE_PATH") or None
+# Query embeddings from concurrent requests are sent to the provider in batches, when its embedding client batches
+EMBEDDING_BATCHING_ENABLED=os.getenv("EMBEDDING_BATCHING_ENABLED", "true").lower() == "true"
+EMBEDDING_BATCH_MAX_WAIT_MS=float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))
+EMBEDDING_BATCH_MAX_SIZE=int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "16"))
+
+# Semantic answer cache
+SEMANTIC_CACHE_ENABLED=os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS=int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+SEMANTIC_CACHE_MAX_ENTRIES=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+# Result cache for "tell me more" and "next steps"
+RESULT_CACHE_ENABLED=os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+RESULT_CACHE_MAX_ENTRIES=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "500"))
+RESULT_CACHE_DIRECTORY=os.getenv("RESULT_CACHE_DIRECTORY") or None
+
 # Manager classes
 memory = MemoryManager()  # Assuming you have a MemoryManager class
 datastore = DynamoDBManager(messages_table=MESSAGES_TABLE)
-knowledge_base = ChromaManager(persist_directory="docs/chroma/", embedding_function=embeddings)
-knowledge_base_spanish = ChromaManager(persist_directory="docs/chroma/spanish", embedding_function=embeddings)
+top_k_policies = {
+    language:AdaptiveTopK(
+        min_k=int(retrieval_setting("MIN_K", language, "2")),
+        max_k=int(retrieval_setting("MAX_K", language, "8")),
+        relevance_floor=float(retrieval_setting("RELEVANCE_FLOOR", language, "0.55")),
+        score_gap=float(retrieval_setting("SCORE_GAP", language, "0.06"))
+    )
+    for language in ("en", "es")
+} if ADAPTIVE_TOP_K_ENABLED else None
+context_packer = ContextPacker(token_budget=KB_TOKEN_BUDGET, token_counter=llm_adapter.count_tokens)
+embedding_batcher = EmbeddingBatcher(
+    embedding_function=embeddings,
+    max_wait_ms=EMBEDDING_BATCH_MAX_WAIT_MS,
+    max_batch=EMBEDDING_BATCH_MAX_SIZE
+) if EMBEDDING_BATCHING_ENABLED and llm_adapter.embeddings_support_batching() else None
+embedding_manager = EmbeddingManager(
+    embedding_function=embeddings,
+    max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+    disk_path=EMBEDDING_CACHE_PATH,
+    batcher=embedding_batcher
+)
+if UNIFIED_INDEX_ENABLED:
+    knowledge_base = ChromaManager(persist_directory=UNIFIED_INDEX_DIRECTORY, embedding_function=embeddings, context_packer=context_packer, embedding_manager=embedding_manager, backend=RETRIEVAL_BACKEND, search_mode=RETRIEVAL_MODE, rescore_candidates=FLAT_INDEX_RESCORE_CANDIDATES, top_k_policies=top_k_policies, retrieval_cache_size=RETRIEVAL_CACHE_MAX_ENTRIES, partition_key="lang")
+    knowledge_base_spanish = knowledge_base
+else:
+    knowledge_base = ChromaManager(persist_directory="docs/chroma/", embedding_function=embeddings, context_packer=context_packer, embedding_manager=embedding_manager, backend=RETRIEVAL_BACKEND, search_mode=RETRIEVAL_MODE, rescore_candidates=FLAT_INDEX_RESCORE_CANDIDATES, top_k_policies=top_k_policies, retrieval_cache_size=RETRIEVAL_CACHE_MAX_ENTRIES)
+    knowledge_base_spanish = ChromaManager(persist_directory="docs/chroma/spanish", embedding_function=embeddings, context_packer=context_packer, embedding_manager=embedding_manager, backend=RETRIEVAL_BACKEND, search_mode=RETRIEVAL_MODE, rescore_candidates=FLAT_INDEX_RESCORE_CANDIDATES, top_k_policies=top_k_policies, retrieval_cache_size=RETRIEVAL_CACHE_MAX_ENTRIES)
 s3_manager = S3Manager(bucket_name=TRANSCRIPT_BUCKET_NAME)
+safety_prefilter = SafetyPrefilter(
+    embedding_manager=embedding_manager,
+    knowledge_bases=[knowledge_base] if UNIFIED_INDEX_ENABLED else [knowledge_base, knowledge_base_spanish],
+    unrelated_threshold=SAFETY_UNRELATED_THRESHOLD,
+    related_threshold=SAFETY_RELATED_THRESHOLD
+) if SAFETY_CHECKS_ENABLED and SAFETY_PREFILTER_ENABLED else None
+semantic_cache = SemanticCacheManager(
+    embedding_manager=embedding_manager,
+    similarity_threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl_seconds=SEMANTIC_CACHE_TTL_SECONDS,
+    max_entries=SEMANTIC_CACHE_MAX_ENTRIES
+) if SEMANTIC_CACHE_ENABLED else None
+result_cache = ResultCacheManager(
+    max_entries=RESULT_CACHE_MAX_ENTRIES,
+    disk_directory=RESULT_CACHE_DIRECTORY
+) if RESULT_CACHE_ENABLED else None
+# Shares retrieval and generation between identical first-turn queries that arrive together
+chat_coalescer = RequestCoalescer()
+# Streamed generations that run on after their client disconnects, referenced so they are not garbage collected
+detached_generations = set()
+
+# Warm-up probes; one per knowledge base language
+WARM_UP_QUERIES = {
+    "en":"What is the Colorado River water supply for Arizona?",
+    "es":"¿Cuál es el suministro de agua del río Colorado para Arizona?"
+}
+# Set once startup warm-up has finished; /ready reports 503 until then
+readiness = {
+    "ready":False,
+    "warm_up_seconds":None,
+    "errors":[]
+}
+
+async def warm_up():
+    """
+    Loads the indexes with a probe search per language, opens the LLM and
+    embedding connections and primes the caches the first requests use.
+    """
+    started = time.monotonic()
+
+    steps = [("llm", llm_adapter.warm_up())]
+    for language, probe in WARM_UP_QUERIES.items():
+        kb = knowledge_base_spanish if language == 'es' else knowledge_base
+        # The probe goes through the embedding manager, so it also opens the embedding connection
+        steps.append((f"knowledge_base_{language}", kb.ann_search(probe, partition=language)))
+    if safety_prefilter is not None:
+        steps.extend((f"topic_centroid_{i}", kb.topic_centroid()) for i, kb in enumerate(safety_prefilter.knowledge_bases))
+
+    results = await asyncio.gather(*[step for _, step in steps], return_exceptions=True)
+    for (name, _), result in zip(steps, results):
+        if isinstance(result, Exception):
+            logging.error(f"Warm-up step {name} failed: {result}")
+            readiness["errors"].append(f"{name}: {result}")
+
+    # Ready even if a step failed: the request path retries the same work, and the failure is reported on /ready
+    readiness["warm_up_seconds"] = round(time.monotonic() - started, 3)
+    readiness["ready"] = True
+    logging.info(f"Warm-up finished: {readiness}")
+
+@app.on_event("startup")
+async def start_warm_up():
+    # In the background so the server accepts connections while /ready reports 503
+    app.state.warm_up_task = asyncio.create_task(warm_up())
+
+@app.get('/ready')
+async def ready_get():
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+# Cache namespaces follow the knowledge bases: knowledge_base_spanish for Spanish, knowledge_base otherwise
+def get_cache_namespace(language):
+    return "es" if language == 'es' else "en"
 
 @app.get("/", response_class=HTMLResponse)
 async def home(request: Request,):
@@ -409,12 +583,128 @@ async def chat_sources_post(request: Request, background_tasks:BackgroundTasks):
     }
     
 
-# Route to handle next steps interactions
-@app.post('/chat_actionItems_api')
-async def chat_action_items_api_post(request: Request, background_tasks:BackgroundTasks):
+def sse_event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
 
-    session_uuid = request.cookies.get(COOKIE_NAME) or request.state.client_cookie_disabled_uuid
+async def generate_cached_response(llm_body):
+    if result_cache is None:
+        return await llm_adapter.generate_response(llm_body=llm_body)
+
+    return await result_cache.get_or_generate(
+        model_id=llm_adapter.model_id,
+        llm_body=llm_body,
+        generate=lambda: llm_adapter.generate_response(llm_body=llm_body)
+    )
+
+def release_detached_generation(task):
+    detached_generations.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Detached generation failed: {task.exception()}")
+
+async def produce_llm_response(llm_body, deltas, leader=None, cache_results=False):
+    """
+    Generates the response for stream_llm_response, putting each delta on
+    the deltas queue and None once generation ends. Returns the full text,
+    which also resolves leader and, with cache_results, is stored in the
+    result cache.
+    """
+    parts=[]
+    try:
+        async for delta in llm_adapter.generate_response_stream(llm_body=llm_body):
+            parts.append(delta)
+            deltas.put_nowait(delta)
+    except BaseException as e:
+        if leader is not None:
+            leader.set_exception(RuntimeError(f"Coalesced generation failed: {e}"))
+            # Mark the exception as retrieved when no request joined
+            leader.exception()
+        raise
+    finally:
+        deltas.put_nowait(None)
+    response_content="".join(parts)
+
+    if leader is not None:
+        leader.set_result(response_content)
+    if cache_results and result_cache is not None:
+        await result_cache.store(llm_adapter.model_id, llm_body, response_content)
+    return response_content
+
+async def stream_llm_response(llm_body, session_uuid, on_complete, cache_results=False, coalesce_key=None):
+    """
+    Relays the model output as server-sent events.
+
+    Each delta is sent as soon as the model produces it. Once generation ends
+    on_complete receives the full text, records it, and returns the formatted
+    response that is sent in the final "done" event; if generation fails an
+    "error" event is sent instead. With cache_results a response already in
+    the result cache is sent as a single "done" event.
+    Identical requests arriving while it streams wait for its result: those
+    with cache_results through the result cache, others through coalesce_key.
+    The generation runs in its own task, so when this client disconnects it
+    still completes for the requests waiting on it.
+    """
+    response_content=None
+    try:
+        if cache_results and result_cache is not None:
+            response_content=await result_cache.lookup(llm_adapter.model_id, llm_body)
+
+        if response_content is None and coalesce_key is not None:
+            response_content=await chat_coalescer.join(coalesce_key)
+    except Exception as e:
+        logging.error(f"Joined generation failed: {e}")
+        yield sse_event({"type":"error"})
+        return
+
+    if response_content is None:
+        if cache_results and result_cache is not None:
+            leader=result_cache.lead(llm_adapter.model_id, llm_body)
+        elif coalesce_key is not None:
+            leader=chat_coalescer.lead(coalesce_key)
+        else:
+            leader=None
+        deltas=asyncio.Queue()
+        producer=asyncio.create_task(produce_llm_response(llm_body, deltas, leader=leader, cache_results=cache_results))
+        try:
+            while True:
+                delta=await deltas.get()
+                if delta is None:
+                    break
+                yield sse_event({"type":"delta","text":delta})
+        except BaseException:
+            # The client disconnected; finish the generation only if other requests wait on it
+            if leader is None:
+                producer.cancel()
+            else:
+                detached_generations.add(producer)
+                producer.add_done_callback(release_detached_generation)
+            raise
+
+        try:
+            response_content=await producer
+        except Exception as e:
+            logging.error(f"Generation failed: {e}")
+            yield sse_event({"type":"error"})
+            return
+
+    resp=await on_complete(response_content)
 
+    yield sse_event({
+        "type":"done",
+        "resp":resp,
+        "msgID": await memory.get_message_count(session_uuid)
+    })
+
+async def single_event_stream(payload):
+    yield sse_event({"type":"done", **payload})
+
+def sse_response(event_stream):
+    return StreamingResponse(
+        event_stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control":"no-cache","X-Accel-Buffering":"no"}
+    )
+
+async def prepare_followup(session_uuid):
     docs=await memory.get_latest_memory( session_id=session_uuid, read="documents")
     sources=await memory.get_latest_memory( session_id=session_uuid, read="sources")
 
@@ -423,7 +713,6 @@ async def chat_action_items_api_post(request: Request, background_tasks:Backgrou
         "sources":sources
     }
 
-
     user_query=await memory.get_latest_memory( session_id=session_uuid, read="content",travel=-2)
     bot_response=await memory.get_latest_memory( session_id=session_uuid, read="content")
     
@@ -436,12 +725,16 @@ async def chat_action_items_api_post(request: Request, background_tasks:Backgrou
         # print("Inside english chromaDB")
         doc_content_str = await knowledge_base.knowledge_to_string({"documents":docs})
 
-    llm_body=await llm_adapter.get_llm_nextsteps_body( kb_data=doc_content_str,user_query=user_query,bot_response=bot_response )
-    response_content = await llm_adapter.generate_response(llm_body=llm_body)
-
-    generated_user_query = f'{custom_tags.tags["NEXTSTEPS_REQUEST"][0]}Provide me the action items{custom_tags.tags["NEXTSTEPS_REQUEST"][1]}'
-    generated_user_query += f'{custom_tags.tags["OG_QUERY"][0]}{user_query}{custom_tags.tags["OG_QUERY"][1]}'
+    return {
+        "docs":docs,
+        "sources":sources,
+        "memory_payload":memory_payload,
+        "user_query":user_query,
+        "bot_response":bot_response,
+        "doc_content_str":doc_content_str
+    }
 
+async def record_followup(session_uuid, followup, generated_user_query, response_content, background_tasks):
     await memory.add_message_to_session( 
         session_id=session_uuid, 
         message={"role":"user","content":generated_user_query},
@@ -450,7 +743,7 @@ async def chat_action_items_api_post(request: Request, background_tasks:Backgrou
     await memory.add_message_to_session( 
         session_id=session_uuid, 
         message={"role":"assistant","content":response_content},
-        source_list=memory_payload
+        source_list=followup["memory_payload"]
     )
     await memory.increment_message_count(session_uuid)
 
@@ -459,90 +752,146 @@ async def chat_action_items_api_post(request: Request, background_tasks:Backgrou
         msg_id=await memory.get_message_count_uuid_combo(session_uuid), 
         user_query=generated_user_query, 
         response_content=response_content,
-        source=sources
+        source=followup["sources"]
     )
 
+def action_items_user_query(user_query):
+    generated_user_query = f'{custom_tags.tags["NEXTSTEPS_REQUEST"][0]}Provide me the action items{custom_tags.tags["NEXTSTEPS_REQUEST"][1]}'
+    generated_user_query += f'{custom_tags.tags["OG_QUERY"][0]}{user_query}{custom_tags.tags["OG_QUERY"][1]}'
+    return generated_user_query
 
-    return {
-        "resp":response_content,
-        "msgID": await memory.increment_message_count(session_uuid)
-    }
+def detailed_user_query(user_query):
+    generated_user_query = f'{custom_tags.tags["MOREDETAIL_REQUEST"][0]}Provide me a more detailed response.{custom_tags.tags["MOREDETAIL_REQUEST"][1]}'
+    generated_user_query += f'{custom_tags.tags["OG_QUERY"][0]}{user_query}{custom_tags.tags["OG_QUERY"][1]}'
+    return generated_user_query
 
 # Route to handle next steps interactions
-@app.post('/chat_detailed_api')
-async def chat_detailed_api_post(request: Request, background_tasks:BackgroundTasks):
+@app.post('/chat_actionItems_api')
+async def chat_action_items_api_post(request: Request, background_tasks:BackgroundTasks):
+
     session_uuid = request.cookies.get(COOKIE_NAME) or request.state.client_cookie_disabled_uuid
 
-    docs=await memory.get_latest_memory( session_id=session_uuid, read="documents")
-    sources=await memory.get_latest_memory( session_id=session_uuid, read="sources")
+    followup=await prepare_followup(session_uuid)
 
-    memory_payload={
-        "documents":docs,
-        "sources":sources
+    llm_body=await llm_adapter.get_llm_nextsteps_body( kb_data=followup["doc_content_str"],user_query=followup["user_query"],bot_response=followup["bot_response"] )
+    response_content = await generate_cached_response(llm_body)
+
+    await record_followup(session_uuid, followup, action_items_user_query(followup["user_query"]), response_content, background_tasks)
+
+    return {
+        "resp":response_content,
+        "msgID": await memory.increment_message_count(session_uuid)
     }
 
-    user_query=await memory.get_latest_memory( session_id=session_uuid, read="content",travel=-2)
-    bot_response=await memory.get_latest_memory( session_id=session_uuid, read="content")
-    
-    language = detect_language(user_query)
+@app.post('/chat_actionItems_api_stream')
+async def chat_action_items_api_stream_post(request: Request, background_tasks:BackgroundTasks):
 
-    if language == 'es':
-        # print("Inside spanish chromaDB")
-        doc_content_str = await knowledge_base_spanish.knowledge_to_string({"documents":docs})
-    else:
-        # print("Inside enlgish chromaDB")
-        doc_content_str = await knowledge_base.knowledge_to_string({"documents":docs})
+    session_uuid = request.cookies.get(COOKIE_NAME) or request.state.client_cookie_disabled_uuid
 
-    llm_body=await llm_adapter.get_llm_detailed_body( kb_data=doc_content_str,user_query=user_query,bot_response=bot_response )
-    response_content = await llm_adapter.generate_response(llm_body=llm_body)
+    followup=await prepare_followup(session_uuid)
 
-    generated_user_query = f'{custom_tags.tags["MOREDETAIL_REQUEST"][0]}Provide me a more detailed response.{custom_tags.tags["MOREDETAIL_REQUEST"][1]}'
-    generated_user_query += f'{custom_tags.tags["OG_QUERY"][0]}{user_query}{custom_tags.tags["OG_QUERY"][1]}'
+    llm_body=await llm_adapter.get_llm_nextsteps_body( kb_data=followup["doc_content_str"],user_query=followup["user_query"],bot_response=followup["bot_response"] )
 
-    await memory.add_message_to_session( 
-        session_id=session_uuid, 
-        message={"role":"user","content":generated_user_query},
-        source_list=[]
-    )
-    await memory.add_message_to_session( 
-        session_id=session_uuid, 
-        message={"role":"assistant","content":response_content},
-        source_list=memory_payload
-    )
-    await memory.increment_message_count(session_uuid)
+    async def on_complete(response_content):
+        await record_followup(session_uuid, followup, action_items_user_query(followup["user_query"]), response_content, background_tasks)
+        return response_content
 
+    return sse_response(stream_llm_response(llm_body, session_uuid, on_complete, cache_results=True))
 
-    background_tasks.add_task(log_message,
-        session_uuid=session_uuid,
-        msg_id=await memory.get_message_count_uuid_combo(session_uuid), 
-        user_query=generated_user_query, 
-        response_content=response_content,
-        source=sources
-    )
+# Route to handle next steps interactions
+@app.post('/chat_detailed_api')
+async def chat_detailed_api_post(request: Request, background_tasks:BackgroundTasks):
+    session_uuid = request.cookies.get(COOKIE_NAME) or request.state.client_cookie_disabled_uuid
+
+    followup=await prepare_followup(session_uuid)
 
+    llm_body=await llm_adapter.get_llm_detailed_body( kb_data=followup["doc_content_str"],user_query=followup["user_query"],bot_response=followup["bot_response"] )
+    response_content = await generate_cached_response(llm_body)
+
+    await record_followup(session_uuid, followup, detailed_user_query(followup["user_query"]), response_content, background_tasks)
 
     return {
         "resp":response_content,
         "msgID": await memory.get_message_count(session_uuid)
     }
 
-# Route to handle chat interactions
-@app.post('/chat_api')
-async def chat_api_post(request: Request, user_query: Annotated[str, Form()], background_tasks:BackgroundTasks ):
-    user_query=user_query
-
+@app.post('/chat_detailed_api_stream')
+async def chat_detailed_api_stream_post(request: Request, background_tasks:BackgroundTasks):
     session_uuid = request.cookies.get(COOKIE_NAME) or request.state.client_cookie_disabled_uuid
 
+    followup=await prepare_followup(session_uuid)
+
+    llm_body=await llm_adapter.get_llm_detailed_body( kb_data=followup["doc_content_str"],user_query=followup["user_query"],bot_response=followup["bot_response"] )
+
+    async def on_complete(response_content):
+        await record_followup(session_uuid, followup, detailed_user_query(followup["user_query"]), response_content, background_tasks)
+        return response_content
+
+    return sse_response(stream_llm_response(llm_body, session_uuid, on_complete, cache_results=True))
+
+def strip_code_fence(text):
+    """
+    Returns text without a surrounding markdown code fence, which models
+    sometimes wrap JSON replies in (```json ... ```).
+    """
+    text=text.strip()
+    if text.startswith("```") and text.endswith("```"):
+        text=text[3:-3].strip()
+        if text.lower().startswith("json"):
+            text=text[4:]
+    return text
+
+async def prepare_chat(session_uuid, user_query, background_tasks):
+    """
+    Runs the safety checks and knowledge base retrieval for a chat turn.
+
+    Safety classification runs concurrently with language detection and
+    retrieval; the retrieval result is discarded when the query is rejected.
+
+    Returns a dict describing the turn. "rejection" holds the response payload
+    when the query fails the safety checks, "cached_response" holds the answer
+    when the semantic cache has one, otherwise "llm_body" is ready for
+    generation.
+    """
+    turn={
+        "rejection":None,
+        "cached_response":None,
+        "llm_body":None,
+        "docs":None,
+        "language":None,
+        "first_turn":None,
+        "coalesce_key":None
+    }
+
+    # create_session clears the stored history, so look for earlier turns first
+    first_turn = len(await memory.get_session_history_all(session_uuid)) == 0
+    turn["first_turn"]=first_turn
+
     await memory.create_session(session_uuid)
-        
-    moderation_result,intent_result = await llm_adapter.safety_checks(user_query)
+    # The safety prefilter, semantic cache and retrieval all embed user_query; embed it once
+    embedding_manager.start_request()
+
+    safety_task = asyncio.create_task(llm_adapter.safety_checks(user_query, prefilter=safety_prefilter))
+
+    language, language_confidence = await asyncio.to_thread(detect_language_with_confidence, user_query)
+    turn["language"]=language
+    cross_lingual = language_confidence < LANGUAGE_CONFIDENCE_THRESHOLD
+    knowledge_task = asyncio.create_task(find_knowledge(user_query, language, first_turn, cross_lingual))
+
+    try:
+        moderation_result,intent_result = await safety_task
+    except BaseException:
+        knowledge_task.cancel()
+        raise
 
     user_intent=1
     prompt_injection=1
     unrelated_topic=1
     not_handled="I am sorry, your request cannot be handled."
+    # A reply that does not parse is treated as a rejection
+    data={"user_intent":user_intent,"prompt_injection":prompt_injection,"unrelated_topic":unrelated_topic}
     try:
-        data = json.loads(intent_result)
+        data = json.loads(strip_code_fence(intent_result))
         user_intent=data["user_intent"]
         prompt_injection=data["prompt_injection"]
         unrelated_topic=data["unrelated_topic"]
@@ -552,6 +901,8 @@ async def chat_api_post(request: Request, user_query: Annotated[str, Form()], ba
 
 
     if( moderation_result or (prompt_injection or unrelated_topic)):
+        knowledge_task.cancel()
+
         response_content= "I am sorry, your request is inappropriate and I cannot answer it." if moderation_result else not_handled
 
         await memory.increment_message_count(session_uuid)
@@ -567,35 +918,96 @@ async def chat_api_post(request: Request, user_query: Annotated[str, Form()], ba
             source=[]
         )
 
-        return {
+        turn["rejection"] = {
             "resp":response_content,
             "msgID": await memory.get_message_count(session_uuid)
         }
+        return turn
 
     await memory.add_message_to_session( 
         session_id=session_uuid, 
         message={"role":"user","content":user_query},
         source_list=[]
     )
-    
-    language = detect_language(user_query)
-    
-    if language == 'es':
+
+    knowledge = await knowledge_task
+    turn["docs"]=knowledge["docs"]
+    turn["coalesce_key"]=knowledge["coalesce_key"]
+
+    if knowledge["cached_response"] is not None:
+        turn["cached_response"]=knowledge["cached_response"]
+        return turn
+
+    turn["llm_body"] = await llm_adapter.get_llm_body( 
+        chat_history=await memory.get_session_history_all(session_uuid), 
+        kb_data=knowledge["doc_content_str"],
+        temperature=.5,
+        max_tokens=500 )
+
+    return turn
+
+async def find_knowledge(user_query, language, first_turn, cross_lingual=False):
+    """
+    Looks the query up in the semantic cache, falling back to knowledge base
+    retrieval. Identical first-turn queries produce identical prompts, so
+    their retrieval is shared through chat_coalescer. Later turns depend on
+    the chat history, so they neither read nor fill the semantic cache.
+    """
+    knowledge={
+        "cached_response":None,
+        "docs":None,
+        "doc_content_str":None,
+        "coalesce_key":None
+    }
+
+    if semantic_cache is not None and first_turn:
+        cached=await semantic_cache.lookup(user_query, namespace=get_cache_namespace(language))
+        if cached is not None:
+            knowledge["cached_response"]=cached["response_content"]
+            knowledge["docs"]=cached["docs"]
+            return knowledge
+
+    if first_turn:
+        knowledge["coalesce_key"]=(get_cache_namespace(language), " ".join(user_query.lower().split()))
+        docs, doc_content_str = await chat_coalescer.run(
+            ("retrieve",) + knowledge["coalesce_key"],
+            lambda: retrieve_knowledge(user_query, language, cross_lingual)
+        )
+    else:
+        docs, doc_content_str = await retrieve_knowledge(user_query, language, cross_lingual)
+
+    knowledge["docs"]=docs
+    knowledge["doc_content_str"]=doc_content_str
+    return knowledge
+
+async def retrieve_knowledge(user_query, language, cross_lingual=False):
+    if UNIFIED_INDEX_ENABLED:
+        # Partitions use the cache namespace labels; uncertain detection searches both languages
+        partition = None if cross_lingual else get_cache_namespace(language)
+        docs = await knowledge_base.ann_search(user_query, partition=partition, language=get_cache_namespace(language))
+        doc_content_str = await knowledge_base.knowledge_to_string(docs)
+    elif language == 'es':
         # print("Inside spanish chromaDB")
-        docs = await knowledge_base_spanish.ann_search(user_query)
+        docs = await knowledge_base_spanish.ann_search(user_query, language='es')
         doc_content_str = await knowledge_base_spanish.knowledge_to_string(docs)
     else:
         #  print("Inside english chromaDB")
-         docs = await knowledge_base.ann_search(user_query)
+         docs = await knowledge_base.ann_search(user_query, language='en')
          doc_content_str = await knowledge_base.knowledge_to_string(docs)
-    
-    llm_body = await llm_adapter.get_llm_body( 
-        chat_history=await memory.get_session_history_all(session_uuid), 
-        kb_data=doc_content_str,
-        temperature=.5,
-        max_tokens=500 )
 
-    response_content = await llm_adapter.generate_response(llm_body=llm_body)
+    return docs, doc_content_str
+
+async def generate_chat_response(turn):
+    if turn["coalesce_key"] is None:
+        return await llm_adapter.generate_response(llm_body=turn["llm_body"])
+
+    return await chat_coalescer.run(
+        ("generate",) + turn["coalesce_key"],
+        lambda: llm_adapter.generate_response(llm_body=turn["llm_body"])
+    )
+
+async def record_chat(session_uuid, user_query, response_content, turn, background_tasks):
+    docs=turn["docs"]
 
     await memory.add_message_to_session( 
         session_id=session_uuid, 
@@ -613,10 +1025,70 @@ async def chat_api_post(request: Request, user_query: Annotated[str, Form()], ba
         source=docs["sources"]
     )
 
+    # Only first-turn answers are independent of the chat history
+    if semantic_cache is not None and turn["first_turn"] and turn["cached_response"] is None:
+        await semantic_cache.store(user_query, namespace=get_cache_namespace(turn["language"]), response_content=response_content, docs=docs)
+
+    return response_content.replace('\n\n', '</p><p>').replace('\n', '<br>')
+
+# Route to handle chat interactions
+@app.post('/chat_api')
+async def chat_api_post(request: Request, user_query: Annotated[str, Form()], background_tasks:BackgroundTasks ):
+    user_query=user_query
+
+    session_uuid = request.cookies.get(COOKIE_NAME) or request.state.client_cookie_disabled_uuid
+
+    turn = await prepare_chat(session_uuid, user_query, background_tasks)
+    if turn["rejection"] is not None:
+        return turn["rejection"]
+
+    response_content = turn["cached_response"]
+    if response_content is None:
+        response_content = await generate_chat_response(turn)
+
     return {
-        "resp": response_content.replace('\n\n', '</p><p>').replace('\n', '<br>'),
+        "resp": await record_chat(session_uuid, user_query, response_content, turn, background_tasks),
         "msgID": await memory.get_message_count(session_uuid)
     }
 
+# Streaming variant of /chat_api; sends the answer as server-sent events
+@app.post('/chat_api_stream')
+async def chat_api_stream_post(request: Request, user_query: Annotated[str, Form()], background_tasks:BackgroundTasks ):
+    session_uuid = request.cookies.get(COOKIE_NAME) or request.state.client_cookie_disabled_uuid
+
+    turn = await prepare_chat(session_uuid, user_query, background_tasks)
+    if turn["rejection"] is not None:
+        return sse_response(single_event_stream(turn["rejection"]))
+
+    if turn["cached_response"] is not None:
+        payload = {
+            "resp": await record_chat(session_uuid, user_query, turn["cached_response"], turn, background_tasks),
+            "msgID": await memory.get_message_count(session_uuid)
+        }
+        return sse_response(single_event_stream(payload))
+
+    async def on_complete(response_content):
+        return await record_chat(session_uuid, user_query, response_content, turn, background_tasks)
+
+    coalesce_key = ("generate",) + turn["coalesce_key"] if turn["coalesce_key"] is not None else None
+    return sse_response(stream_llm_response(turn["llm_body"], session_uuid, on_complete, coalesce_key=coalesce_key))
+
+@app.get('/metrics')
+async def metrics_get():
+    return {
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "chat_coalescing": chat_coalescer.stats(),
+        "context_packing": context_packer.stats(),
+        "embeddings": embedding_manager.stats(),
+        "embedding_batching": embedding_batcher.stats() if embedding_batcher is not None else None,
+        "safety_prefilter": safety_prefilter.stats() if safety_prefilter is not None else None,
+        "adaptive_top_k": {language:policy.stats() for language, policy in top_k_policies.items()} if top_k_policies is not None else None,
+        "retrieval_cache": knowledge_base.retrieval_cache_stats() if UNIFIED_INDEX_ENABLED else {
+            "en": knowledge_base.retrieval_cache_stats(),
+            "es": knowledge_base_spanish.retrieval_cache_stats()
+        }
+    }
+
 if __name__ == "__main__":
     uvicorn.run(app, host='0.0.0.0', port=8000)
\ No newline at end of file
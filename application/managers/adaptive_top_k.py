@@ -0,0 +1,48 @@
+import math
+from collections import Counter
+
+def relevance_score(distance):
+    # LangChain's relevance for Chroma's squared L2 distance between unit-length embeddings
+    return 1.0 - distance / math.sqrt(2)
+
+class AdaptiveTopK():
+    """
+    Chooses how many retrieved chunks to keep from their relevance scores.
+
+    Relevance is relevance_score of Chroma's squared L2 distance, the value
+    LangChain's similarity_search_with_relevance_scores reports. Chunks
+    below relevance_floor are dropped, and the ranking is cut at the first
+    drop between neighbours larger than score_gap; between min_k and max_k
+    chunks are kept.
+    """
+    def __init__(self, min_k=2, max_k=8, relevance_floor=0.55, score_gap=0.06, *args, **kwargs):
+        self.min_k=min_k
+        self.max_k=max_k
+        self.relevance_floor=relevance_floor
+        self.score_gap=score_gap
+
+        self.chosen=Counter()
+
+        super().__init__(*args,**kwargs)
+
+    def choose_k(self, relevances):
+        """
+        Returns the number of leading results to keep for relevances sorted
+        best first.
+        """
+        k=min(len(relevances), self.max_k)
+        for i in range(max(min(self.min_k, k), 1), k):
+            if relevances[i] < self.relevance_floor or relevances[i - 1] - relevances[i] > self.score_gap:
+                k=i
+                break
+
+        self.chosen[k]+=1
+        return k
+
+    def stats(self):
+        selections=sum(self.chosen.values())
+        return {
+            "selections":selections,
+            "average_k":sum(k * count for k, count in self.chosen.items()) / selections if selections else 0.0,
+            "k_counts":{str(k):count for k, count in sorted(self.chosen.items())}
+        }
@@ -1,12 +1,75 @@
+import os
 import re
+import asyncio
+import logging
+import numpy as np
+from collections import OrderedDict
 from langchain_community.vectorstores import Chroma
 from mappings.knowledge_sources import knowledge_sources
+from langchain_core.documents import Document
+from managers.flat_index import FlatIndex
+from managers.lexical_index import LexicalIndex
+from managers.adaptive_top_k import relevance_score
+from managers.index_manifest import manifest_path, read_index_manifest
 
 class ChromaManager():
-    def __init__(self, persist_directory, embedding_function, *args, **kwargs):
-        self.vectordb = Chroma(persist_directory=persist_directory, embedding_function=embedding_function)
+    def __init__(self, persist_directory, embedding_function, context_packer=None, embedding_manager=None, backend="chroma", search_mode="vector", k=4, fusion_candidates=20, partition_key=None, rescore_candidates=0, top_k_policies=None, retrieval_cache_size=0, *args, **kwargs):
+        self.persist_directory = persist_directory
+        self.embedding_function = embedding_function
+        self.embedding_manager = embedding_manager
+        self.context_packer = context_packer
+        self.centroid = None
+        self.k = k
+        self.fusion_candidates = fusion_candidates
+        # Metadata field (e.g. "lang") that partitions a collection holding several languages
+        self.partition_key = partition_key
+        # Candidates from a quantized flat index re-ranked with the full-precision Chroma embeddings; 0 disables
+        self.rescore_candidates = rescore_candidates
+        # AdaptiveTopK per language; without one a search returns k chunks
+        self.top_k_policies = top_k_policies or {}
+
+        # Chunk ids and scores of recent searches, dropped whenever the index manifest changes
+        self.retrieval_cache_size = retrieval_cache_size
+        self.retrieval_cache = OrderedDict()
+        self.retrieval_cache_hits = 0
+        self.retrieval_cache_misses = 0
+        self.manifest_mtime = None
+        self.index_version = None
+
+        # "flat" answers searches from the exported matrix (scripts/export_flat_index.py) instead of Chroma's HNSW index
+        self.flat_index = None
+        if backend == "flat":
+            try:
+                self.flat_index = FlatIndex(self.flat_index_directory())
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Flat index unavailable for {persist_directory}, using Chroma: {e}")
+
+        # A flat index answers searches on its own, so an image can ship it without the Chroma store;
+        # Chroma is then only opened to re-score quantized candidates, when the store is there
+        self.vectordb = None
+        if self.flat_index is None or (rescore_candidates > 0 and os.path.exists(os.path.join(persist_directory, "chroma.sqlite3"))):
+            self.vectordb = Chroma(persist_directory=persist_directory, embedding_function=embedding_function)
+
+        # "hybrid" fuses BM25 (scripts/build_lexical_index.py) and vector rankings
+        self.lexical_index = None
+        if search_mode == "hybrid":
+            try:
+                self.lexical_index = LexicalIndex(self.lexical_index_directory())
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Lexical index unavailable for {persist_directory}, using vector search only: {e}")
+
+        # Source records by source path and by chunk id, so retrieval does not parse paths per query
+        self.source_records = {}
+        self.chunk_sources = {}
+        self.build_source_index()
         
         super().__init__(*args,**kwargs)
+
+    def flat_index_directory(self):
+        return os.path.join(self.persist_directory, "flat_index")
+
+    def lexical_index_directory(self):
+        return os.path.join(self.persist_directory, "lexical_index")
     
     def parse_source(self,source):
         pattern = r'[\\/]+([^\\/]+\.pdf)$' #used windows OS to upload to chromaDB so used \,eg:newData\\NCA5_Ch28_Southwest_esp.pdf
@@ -35,21 +98,310 @@ class ChromaManager():
                 "human_readable": "",
             }
             return payload
+
+    def source_record(self, source):
+        record = self.source_records.get(source)
+        if record is None:
+            record = self.parse_source(source)
+            self.source_records[source] = record
+        return record
+
+    def build_source_index(self, batch_size=1000):
+        chunk_sources = {}
+        if self.flat_index is not None:
+            for chunk_id, metadata in zip(self.flat_index.ids, self.flat_index.metadatas):
+                chunk_sources[chunk_id] = self.source_record(metadata.get("source", ""))
+            self.chunk_sources = chunk_sources
+            return
+
+        collection = self.vectordb._collection
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            batch = collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+            for chunk_id, metadata in zip(batch["ids"], batch["metadatas"]):
+                chunk_sources[chunk_id] = self.source_record((metadata or {}).get("source", ""))
+        self.chunk_sources = chunk_sources
+
+    def sources_for(self, results):
+        """
+        Returns the distinct source records of [(chunk_id, document)] results
+        in retrieval order.
+        """
+        records = {}
+        for chunk_id, document in results:
+            # Chunks added after startup are not in the table yet
+            record = self.chunk_sources.get(chunk_id) or self.source_record(document.metadata["source"])
+            records.setdefault(record["full_path"], record)
+        return list(records.values())
         
-    async def ann_search(self, user_query):
-        docs=self.vectordb.similarity_search(user_query)
-        sources=[docs[i].metadata["source"] for i in range(len(docs))]
+    async def embed_query(self, user_query):
+        if self.embedding_manager is not None:
+            # Reuse the vector already computed for this query, if any
+            return await self.embedding_manager.embed_query(user_query)
+        # Embedding the query is a network call; keep it off the event loop
+        vector=await asyncio.to_thread(self.embedding_function.embed_query, user_query)
+        return np.asarray(vector, dtype=np.float32)
+
+    def vector_search(self, vector, k=4, partition=None):
+        """
+        Returns [(chunk_id, document, distance)] of the k chunks nearest to
+        vector, nearest first. partition limits the search to chunks whose
+        partition_key field has that value.
+        """
+        # One reference for the whole search; reload_flat_index may swap in a new export meanwhile
+        flat_index=self.flat_index
+        if flat_index is not None:
+            if flat_index.quantized and self.rescore_candidates > k and self.vectordb is not None:
+                nearest=self.rescore(vector, flat_index.search(vector, self.rescore_candidates, partition=partition), flat_index)[:k]
+            else:
+                nearest=flat_index.search(vector, k, partition=partition)
+            return [
+                (flat_index.ids[position], flat_index.document(position), distance)
+                for position, distance in nearest
+            ]
+
+        where={self.partition_key:partition} if self.partition_key and partition else None
+        result=self.vectordb._collection.query(query_embeddings=[vector.tolist()], n_results=k, where=where, include=["documents", "metadatas", "distances"])
+        return [
+            (chunk_id, Document(page_content=text or "", metadata=metadata or {}), distance)
+            for chunk_id, text, metadata, distance in zip(result["ids"][0], result["documents"][0], result["metadatas"][0], result["distances"][0])
+        ]
 
+    def rescore(self, vector, candidates, flat_index):
+        """
+        Re-ranks [(position, distance)] flat index candidates by their
+        distance to the full-precision embeddings stored in Chroma. Candidates
+        Chroma does not have keep their quantized distance.
+        """
+        ids=[flat_index.ids[position] for position, _ in candidates]
+        result=self.vectordb._collection.get(ids=ids, include=["embeddings"])
+        full={chunk_id:embedding for chunk_id, embedding in zip(result["ids"], result["embeddings"])}
 
-        # Map to human readable; if source is not in the mapping use source name
-        sources_parsed = [self.parse_source(source) for source in list(set(sources))]
+        query=np.asarray(vector, dtype=np.float32)
+        rescored=[]
+        for chunk_id, (position, distance) in zip(ids, candidates):
+            if chunk_id in full:
+                difference=np.asarray(full[chunk_id], dtype=np.float32) - query
+                distance=float(difference @ difference)
+            rescored.append((position, distance))
+        return sorted(rescored, key=lambda candidate: candidate[1])
 
+    def documents_by_id(self, chunk_ids):
+        flat_index=self.flat_index
+        if flat_index is not None:
+            return {chunk_id:flat_index.document(flat_index.positions[chunk_id]) for chunk_id in chunk_ids if chunk_id in flat_index.positions}
 
+        result=self.vectordb._collection.get(ids=list(chunk_ids), include=["documents", "metadatas"])
         return {
-            "documents":docs,
-            "sources":sources_parsed
+            chunk_id:Document(page_content=text or "", metadata=metadata or {})
+            for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+        }
+
+    def hybrid_search(self, user_query, vector_results, k, partition=None, rrf_k=60):
+        """
+        Fuses the vector and BM25 rankings with reciprocal rank fusion and
+        returns [(chunk_id, document)] of the k best chunks.
+        """
+        lexical_results=self.lexical_index.search(user_query, self.fusion_candidates, partition=partition)
+
+        scores={}
+        for ranking in ([chunk_id for chunk_id, _, _ in vector_results], [chunk_id for chunk_id, _ in lexical_results]):
+            for rank, chunk_id in enumerate(ranking):
+                scores[chunk_id]=scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+
+        best=sorted(scores, key=scores.get, reverse=True)[:k]
+        documents={chunk_id:document for chunk_id, document, _ in vector_results}
+        missing=[chunk_id for chunk_id in best if chunk_id not in documents]
+        if missing:
+            documents.update(self.documents_by_id(missing))
+        return [(chunk_id, documents[chunk_id]) for chunk_id in best if chunk_id in documents]
+
+    def search(self, user_query, vector, partition=None, policy=None):
+        """
+        Returns ([(chunk_id, document)], relevances) for the query, with the
+        vector relevance of each returned chunk (None for chunks only the
+        lexical ranking found). With a policy the number of chunks follows
+        the vector relevance scores, otherwise self.k chunks are returned.
+        """
+        candidates=policy.max_k if policy is not None else self.k
+        if self.lexical_index is not None:
+            candidates=max(candidates, self.fusion_candidates)
+        vector_results=self.vector_search(vector, candidates, partition=partition)
+
+        relevances=[relevance_score(distance) for _, _, distance in vector_results]
+        k=policy.choose_k(relevances) if policy is not None else min(self.k, len(vector_results))
+
+        if self.lexical_index is not None:
+            results=self.hybrid_search(user_query, vector_results, k, partition=partition)
+            vector_relevances={chunk_id:relevance for (chunk_id, _, _), relevance in zip(vector_results, relevances)}
+            return results, [vector_relevances.get(chunk_id) for chunk_id, _ in results]
+        return [(chunk_id, document) for chunk_id, document, _ in vector_results[:k]], relevances[:k]
+
+    def current_index_version(self):
+        """
+        Returns the version in the index manifest, rereading it when the file
+        changes; a new version empties the retrieval cache.
+        """
+        try:
+            mtime=os.stat(manifest_path(self.persist_directory)).st_mtime_ns
+        except OSError:
+            mtime=None
+
+        if mtime != self.manifest_mtime:
+            manifest=read_index_manifest(self.persist_directory) or {}
+            self.manifest_mtime=mtime
+            self.index_version=manifest.get("version")
+            self.retrieval_cache.clear()
+            self.reload_flat_index()
+
+        return self.index_version
+
+    def reload_flat_index(self):
+        """
+        Reopens the flat index when it has been re-exported since it was
+        loaded (ingestion refreshes the export along with the collection).
+        """
+        if self.flat_index is None or not self.flat_index.replaced():
+            return
+        try:
+            flat_index=FlatIndex(self.flat_index_directory())
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not reload the flat index for {self.persist_directory}, keeping the loaded one: {e}")
+            return
+        self.flat_index=flat_index
+        self.build_source_index()
+
+    def retrieval_cache_key(self, user_query, partition, policy):
+        normalized=" ".join(re.sub(r'[^\w\s]', ' ', user_query.lower()).split())
+        k_setting=(policy.min_k, policy.max_k, policy.relevance_floor, policy.score_gap) if policy is not None else self.k
+        return (normalized, partition, k_setting, self.current_index_version())
+
+    async def cached_search(self, cache_key):
+        """
+        Returns (results, relevances) for a cached search, or None.
+        """
+        cached=self.retrieval_cache.get(cache_key)
+        if cached is None:
+            self.retrieval_cache_misses+=1
+            return None
+
+        self.retrieval_cache.move_to_end(cache_key)
+        self.retrieval_cache_hits+=1
+        chunk_ids, relevances = cached
+        if self.flat_index is not None:
+            documents=self.documents_by_id(chunk_ids)
+        else:
+            documents=await asyncio.to_thread(self.documents_by_id, chunk_ids)
+        kept=[(chunk_id, relevance) for chunk_id, relevance in zip(chunk_ids, relevances) if chunk_id in documents]
+        return [(chunk_id, documents[chunk_id]) for chunk_id, _ in kept], [relevance for _, relevance in kept]
+
+    def cache_search(self, cache_key, results, relevances):
+        self.retrieval_cache[cache_key]=([chunk_id for chunk_id, _ in results], relevances)
+        self.retrieval_cache.move_to_end(cache_key)
+        while len(self.retrieval_cache) > self.retrieval_cache_size:
+            self.retrieval_cache.popitem(last=False)
+
+    async def ann_search(self, user_query, partition=None, language=None):
+        policy=self.top_k_policies.get(language or partition)
+
+        cache_key=None
+        cached=None
+        if self.retrieval_cache_size > 0:
+            # A repeat query skips both the embedding call and the vector search
+            cache_key=self.retrieval_cache_key(user_query, partition, policy)
+            cached=await self.cached_search(cache_key)
+
+        if cached is not None:
+            results, relevances = cached
+        else:
+            vector=await self.embed_query(user_query)
+            if self.flat_index is not None and self.lexical_index is None:
+                # A single matrix-vector product; cheaper inline than a thread hop
+                results, relevances = self.search(user_query, vector, partition, policy)
+            else:
+                results, relevances = await asyncio.to_thread(self.search, user_query, vector, partition, policy)
+            if cache_key is not None:
+                self.cache_search(cache_key, results, relevances)
+
+        retrieval={
+            "k":len(results),
+            "scores":[round(relevance, 4) if relevance is not None else None for relevance in relevances],
+            "cached":cached is not None
+        }
+        logging.info(f"Retrieved from {self.persist_directory}: {retrieval}")
+
+        return {
+            "documents":[document for _, document in results],
+            "sources":self.sources_for(results),
+            "retrieval":retrieval
+        }
+
+    def retrieval_cache_stats(self):
+        return {
+            "hits":self.retrieval_cache_hits,
+            "misses":self.retrieval_cache_misses,
+            "entries":len(self.retrieval_cache),
+            "index_version":self.index_version
         }
 
     async def knowledge_to_string(self, docs, doc_field="documents"):
         target=docs[doc_field]
-        return " ".join([target[i].page_content for i in range(len(target))])
\ No newline at end of file
+        if self.context_packer is not None:
+            context, _ = self.context_packer.pack(target)
+            return context
+        return " ".join([target[i].page_content for i in range(len(target))])
+
+    def embedding_batches(self, batch_size=1000):
+        """
+        Yields every chunk embedding of the collection as float32 arrays of
+        up to batch_size rows, read from the flat index when there is one.
+        """
+        if self.flat_index is not None:
+            for start in range(0, len(self.flat_index), batch_size):
+                yield self.flat_index.restored(start, min(start + batch_size, len(self.flat_index)))
+            return
+
+        collection=self.vectordb._collection
+        for offset in range(0, collection.count(), batch_size):
+            batch=collection.get(include=["embeddings"], limit=batch_size, offset=offset)
+            yield np.asarray(batch["embeddings"], dtype=np.float32)
+
+    def compute_topic_centroid(self, batch_size=1000):
+        """
+        Returns the normalized mean of every chunk embedding in the
+        collection. The result is cached next to the index and recomputed
+        when the collection size changes.
+        """
+        total=len(self.flat_index) if self.flat_index is not None else self.vectordb._collection.count()
+        cache_path=os.path.join(self.persist_directory, "topic_centroid.npz")
+
+        try:
+            cached=np.load(cache_path)
+            if int(cached["count"]) == total:
+                return cached["centroid"]
+        except (OSError, KeyError, ValueError):
+            pass
+
+        centroid=None
+        for vectors in self.embedding_batches(batch_size):
+            if len(vectors) == 0:
+                continue
+            vectors/=np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            batch_sum=vectors.sum(axis=0)
+            centroid=batch_sum if centroid is None else centroid + batch_sum
+
+        if centroid is None:
+            return None
+        centroid/=max(np.linalg.norm(centroid), 1e-12)
+
+        try:
+            np.savez(cache_path, centroid=centroid, count=total)
+        except OSError as e:
+            print(f"Error caching topic centroid: {e}")
+
+        return centroid
+
+    async def topic_centroid(self):
+        if self.centroid is None:
+            self.centroid=await asyncio.to_thread(self.compute_topic_centroid)
+        return self.centroid
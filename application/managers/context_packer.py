@@ -0,0 +1,144 @@
+import re
+import logging
+
+class ContextPacker():
+    """
+    Packs retrieved chunks into the knowledge context of a prompt.
+
+    Chunks from the same source whose text overlaps (ingestion splits with a
+    150 character overlap) are merged, near-duplicate passages are dropped,
+    and the remaining passages fill the token budget in relevance order; the
+    passage that crosses the budget is truncated to fit.
+    """
+    def __init__(self, token_budget=1500, token_counter=None, duplicate_threshold=0.8, min_overlap=20, max_overlap=400, min_truncated_tokens=50, *args, **kwargs):
+        self.token_budget=token_budget
+        self.token_counter=token_counter or (lambda text: (len(text) + 3) // 4)
+        self.duplicate_threshold=duplicate_threshold
+        self.min_overlap=min_overlap
+        self.max_overlap=max_overlap
+        self.min_truncated_tokens=min_truncated_tokens
+
+        self.packed=0
+        self.tokens_in=0
+        self.tokens_out=0
+
+        super().__init__(*args,**kwargs)
+
+    def overlap_length(self, first, second):
+        # Longest suffix of first that is a prefix of second
+        longest=min(len(first), len(second), self.max_overlap)
+        for length in range(longest, self.min_overlap - 1, -1):
+            if first.endswith(second[:length]):
+                return length
+        return 0
+
+    def merge(self, first, second):
+        """
+        Returns the merged text of two passages from the same source, or None
+        when they neither contain nor overlap each other.
+        """
+        if second in first:
+            return first
+        if first in second:
+            return second
+
+        length=self.overlap_length(first, second)
+        if length:
+            return first + second[length:]
+
+        length=self.overlap_length(second, first)
+        if length:
+            return second + first[length:]
+
+        return None
+
+    def truncate(self, text, text_tokens, max_tokens):
+        cut=text[:int(len(text) * max_tokens / text_tokens)]
+        while cut and self.token_counter(cut) > max_tokens:
+            cut=cut[:int(len(cut) * 0.9)]
+        return cut.rsplit(" ", 1)[0] if " " in cut else cut
+
+    def shingles(self, text, size=3):
+        words=re.findall(r'\w+', text.lower())
+        if len(words) <= size:
+            return {tuple(words)}
+        return {tuple(words[i:i+size]) for i in range(len(words) - size + 1)}
+
+    def is_near_duplicate(self, shingles, passages):
+        # A passage is redundant when most of its word 3-grams are already in a selected passage
+        if not shingles:
+            return False
+        for passage in passages:
+            if len(shingles & passage["shingles"]) / len(shingles) >= self.duplicate_threshold:
+                return True
+        return False
+
+    def pack(self, documents):
+        """
+        Returns (context, stats) for documents given in relevance order.
+        """
+        passages=[]
+        for document in documents:
+            text=document.page_content.strip()
+            if not text:
+                continue
+            source=document.metadata.get("source", "")
+
+            merged=False
+            for passage in passages:
+                if passage["source"] != source:
+                    continue
+                merged_text=self.merge(passage["text"], text)
+                if merged_text is not None:
+                    passage["text"]=merged_text
+                    passage["shingles"]=self.shingles(merged_text)
+                    merged=True
+                    break
+            if merged:
+                continue
+
+            shingles=self.shingles(text)
+            if self.is_near_duplicate(shingles, passages):
+                continue
+
+            passages.append({"source":source, "text":text, "shingles":shingles})
+
+        selected=[]
+        used_tokens=0
+        for passage in passages:
+            passage_tokens=self.token_counter(passage["text"])
+            remaining=self.token_budget - used_tokens
+            if passage_tokens > remaining:
+                # Fill the rest of the budget with the start of the passage, then stop
+                if remaining >= self.min_truncated_tokens:
+                    text=self.truncate(passage["text"], passage_tokens, remaining)
+                    selected.append(text)
+                    used_tokens+=self.token_counter(text)
+                break
+            selected.append(passage["text"])
+            used_tokens+=passage_tokens
+
+        tokens_in=self.token_counter(" ".join(document.page_content for document in documents))
+
+        self.packed+=1
+        self.tokens_in+=tokens_in
+        self.tokens_out+=used_tokens
+
+        stats={
+            "chunks_in":len(documents),
+            "passages_out":len(selected),
+            "tokens_in":tokens_in,
+            "tokens_out":used_tokens,
+            "tokens_saved":max(tokens_in - used_tokens, 0)
+        }
+        logging.info(f"Packed knowledge context: {stats}")
+
+        return " ".join(selected), stats
+
+    def stats(self):
+        return {
+            "packed":self.packed,
+            "tokens_in":self.tokens_in,
+            "tokens_out":self.tokens_out,
+            "tokens_saved":max(self.tokens_in - self.tokens_out, 0)
+        }
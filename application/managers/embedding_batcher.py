@@ -0,0 +1,74 @@
+import asyncio
+
+class EmbeddingBatcher():
+    """
+    Batches query embeddings across concurrent requests.
+
+    Texts arriving within max_wait_ms of the first one in a batch, up to
+    max_batch of them, are embedded with a single embed_documents call and
+    each caller gets its own vector back. Only useful with an embedding
+    function whose embed_documents sends the texts in one request.
+    """
+    def __init__(self, embedding_function, max_wait_ms=5, max_batch=16, *args, **kwargs):
+        self.embedding_function=embedding_function
+        self.max_wait=max_wait_ms / 1000
+        self.max_batch=max_batch
+
+        self.pending=[]
+        self.flush_handle=None
+        # Running batches, referenced so they are not garbage collected mid-flight
+        self.running=set()
+        self.batches=0
+        self.items=0
+        self.largest_batch=0
+
+        super().__init__(*args,**kwargs)
+
+    async def embed(self, text):
+        loop=asyncio.get_running_loop()
+        future=loop.create_future()
+        self.pending.append((text, future))
+
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle=loop.call_later(self.max_wait, self.flush)
+
+        return await future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle=None
+
+        batch, self.pending = self.pending, []
+        if batch:
+            task=asyncio.ensure_future(self.run_batch(batch))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+
+    async def run_batch(self, batch):
+        self.batches+=1
+        self.items+=len(batch)
+        self.largest_batch=max(self.largest_batch, len(batch))
+
+        texts=[text for text, _ in batch]
+        try:
+            vectors=await asyncio.to_thread(self.embedding_function.embed_documents, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    def stats(self):
+        return {
+            "batches":self.batches,
+            "items":self.items,
+            "average_batch":self.items / self.batches if self.batches else 0.0,
+            "largest_batch":self.largest_batch
+        }
@@ -0,0 +1,132 @@
+import dbm
+import asyncio
+import hashlib
+import threading
+import contextvars
+import numpy as np
+from collections import OrderedDict
+from managers.request_coalescer import RequestCoalescer
+
+# Vectors embedded while handling the current request
+request_vectors=contextvars.ContextVar("request_vectors", default=None)
+
+class EmbeddingManager():
+    """
+    Embeds query text once and shares the vector.
+
+    Vectors are kept for the current request, in a process-wide LRU and,
+    when disk_path is set, in a dbm file so they survive restarts. Concurrent
+    requests for the same text share a single embedding call, and misses for
+    different texts go through the batcher when one is given.
+    """
+    def __init__(self, embedding_function, max_entries=2048, disk_path=None, batcher=None, *args, **kwargs):
+        self.embedding_function=embedding_function
+        self.batcher=batcher
+        self.max_entries=max_entries
+        # Vectors from different embedding models must not mix on disk
+        self.model_name=getattr(embedding_function, "model", None) or getattr(embedding_function, "model_id", "")
+
+        self.disk=None
+        self.disk_lock=threading.Lock()
+        if disk_path:
+            try:
+                self.disk=dbm.open(disk_path, "c")
+            except dbm.error as e:
+                print(f"Error opening embedding cache {disk_path}: {e}")
+
+        self.entries=OrderedDict()
+        self.coalescer=RequestCoalescer()
+        self.hits=0
+        self.disk_hits=0
+        self.misses=0
+
+        super().__init__(*args,**kwargs)
+
+    def start_request(self):
+        """
+        Gives the calling request (and the tasks it creates) its own vector
+        context.
+        """
+        request_vectors.set({})
+
+    def normalize_text(self, text):
+        return " ".join(text.split())
+
+    def make_key(self, text):
+        return hashlib.sha256(f"{self.model_name}\n{text}".encode("utf-8")).hexdigest()
+
+    def read_disk(self, key):
+        with self.disk_lock:
+            value=self.disk.get(key)
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype=np.float32)
+
+    def write_disk(self, key, vector):
+        with self.disk_lock:
+            self.disk[key]=vector.tobytes()
+
+    def remember(self, key, vector):
+        self.entries[key]=vector
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def embed_query(self, text):
+        """
+        Returns the embedding of text as a float32 array.
+        """
+        text=self.normalize_text(text)
+        key=self.make_key(text)
+
+        vectors=request_vectors.get()
+        if vectors is not None and key in vectors:
+            return vectors[key]
+
+        vector=await self.lookup(key, text)
+        if vectors is not None:
+            vectors[key]=vector
+        return vector
+
+    async def lookup(self, key, text):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits+=1
+            return self.entries[key]
+
+        if self.disk is not None:
+            vector=await asyncio.to_thread(self.read_disk, key)
+            if vector is not None:
+                self.disk_hits+=1
+                self.remember(key, vector)
+                return vector
+
+        if self.coalescer.pending(key) is None:
+            self.misses+=1
+
+        return await self.coalescer.run(key, lambda: self.compute(key, text))
+
+    async def compute(self, key, text):
+        if self.batcher is not None:
+            vector=await self.batcher.embed(text)
+        else:
+            vector=await asyncio.to_thread(self.embedding_function.embed_query, text)
+        vector=np.asarray(vector, dtype=np.float32)
+
+        self.remember(key, vector)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.write_disk, key, vector)
+            except dbm.error as e:
+                print(f"Error writing embedding cache entry: {e}")
+
+        return vector
+
+    def stats(self):
+        return {
+            "hits":self.hits,
+            "disk_hits":self.disk_hits,
+            "misses":self.misses,
+            "shared":self.coalescer.coalesced,
+            "entries":len(self.entries)
+        }
@@ -0,0 +1,242 @@
+import os
+import json
+import mmap
+import numpy as np
+from collections import Counter
+from langchain_core.documents import Document
+
+class FlatIndex():
+    """
+    Exact nearest neighbour search over an exported Chroma collection.
+
+    The export is a contiguous matrix of chunk embeddings (vectors.npy), the
+    squared norm of each row (norms.npy), the chunk texts back to back in
+    chunks.bin with their byte offsets (offsets.npy), and the chunk ids and
+    metadata (metadata.json). The arrays and texts are memory-mapped, so
+    worker processes share the same pages.
+
+    An export can be partitioned on a metadata field (e.g. "lang"): rows of
+    each partition are contiguous, so searching one partition only scans its
+    slice of the matrix.
+
+    Rows are stored as float32, float16, or int8 with a per-row scale
+    (scales.npy) so that row = int8_row * scale. Distances are squared L2,
+    the same as Chroma's default space, computed on the stored vectors.
+    """
+    def __init__(self, directory, block_size=65536, *args, **kwargs):
+        self.directory=directory
+        self.block_size=block_size
+
+        self.vectors=np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.norms=np.load(os.path.join(directory, "norms.npy"), mmap_mode="r")
+        self.offsets=np.load(os.path.join(directory, "offsets.npy"), mmap_mode="r")
+        scales_path=os.path.join(directory, "scales.npy")
+        self.scales=np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None
+        with open(os.path.join(directory, "metadata.json"), "r", encoding="utf-8") as f:
+            # An export swaps metadata.json in last, so a new file means a new export
+            self.export_inode=os.fstat(f.fileno()).st_ino
+            table=json.load(f)
+        self.ids=table["ids"]
+        self.metadatas=table["metadatas"]
+        self.positions={chunk_id:position for position, chunk_id in enumerate(self.ids)}
+        self.partitions=table.get("partitions", {})
+
+        with open(os.path.join(directory, "chunks.bin"), "rb") as f:
+            # mmap refuses empty files
+            self.chunks=mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+        super().__init__(*args,**kwargs)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def replaced(self):
+        """
+        Returns True when the directory holds a newer export than this one.
+        """
+        try:
+            return os.stat(os.path.join(self.directory, "metadata.json")).st_ino != self.export_inode
+        except OSError:
+            return False
+
+    @property
+    def quantized(self):
+        return self.vectors.dtype != np.float32
+
+    @staticmethod
+    def quantize(vectors, dtype):
+        """
+        Returns (stored, scales, restored) for float32 vectors: the rows in
+        the stored dtype, their per-row scales (None unless int8), and the
+        float32 vectors the stored rows stand for.
+        """
+        if dtype == "int8":
+            scales=np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0]=1.0
+            stored=np.rint(vectors / scales[:, None]).astype(np.int8)
+            return stored, scales.astype(np.float32), stored.astype(np.float32) * scales[:, None]
+        stored=vectors.astype(dtype)
+        return stored, None, stored.astype(np.float32)
+
+    @staticmethod
+    def export(collection, directory, dtype="float32", batch_size=1000, partition_key=None):
+        """
+        Writes the chunks of a Chroma collection to directory, grouped by the
+        partition_key metadata field when one is given. Returns the number of
+        chunks written.
+        """
+        os.makedirs(directory, exist_ok=True)
+        total=collection.count()
+        # Every file is written under a temporary name and swapped in at the end, so a process that has the
+        # previous export memory-mapped keeps reading it; metadata.json is swapped in last
+        def staged(name):
+            stem, extension = os.path.splitext(name)
+            return os.path.join(directory, f"{stem}.tmp{extension}")
+
+        if partition_key is None:
+            groups=[(None, None, total)]
+        else:
+            counts=Counter()
+            for offset in range(0, total, batch_size):
+                batch=collection.get(include=["metadatas"], limit=batch_size, offset=offset)
+                for metadata in batch["metadatas"]:
+                    label=(metadata or {}).get(partition_key)
+                    if label is None:
+                        raise ValueError(f"Chunk without {partition_key} metadata; cannot partition the export")
+                    counts[label]+=1
+            groups=[(label, {partition_key:label}, counts[label]) for label in sorted(counts)]
+
+        ids=[]
+        metadatas=[]
+        offsets=[0]
+        partitions={}
+        vectors=None
+        norms=np.zeros(total, dtype=np.float32)
+        scales=np.ones(total, dtype=np.float32)
+        with open(staged("chunks.bin"), "wb") as chunks:
+            for label, where, count in groups:
+                start=len(ids)
+                for offset in range(0, count, batch_size):
+                    batch=collection.get(where=where, include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+                    stored, batch_scales, restored = FlatIndex.quantize(np.asarray(batch["embeddings"], dtype=np.float32), dtype)
+                    if vectors is None:
+                        vectors=np.lib.format.open_memmap(staged("vectors.npy"), mode="w+", dtype=dtype, shape=(total, stored.shape[1]))
+                    rows=slice(len(ids), len(ids) + len(stored))
+                    vectors[rows]=stored
+                    # Norms come from the stored precision so distances match the matrix used at query time
+                    norms[rows]=np.einsum("ij,ij->i", restored, restored)
+                    if batch_scales is not None:
+                        scales[rows]=batch_scales
+
+                    for chunk_id, text, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+                        data=(text or "").encode("utf-8")
+                        chunks.write(data)
+                        offsets.append(offsets[-1] + len(data))
+                        ids.append(chunk_id)
+                        metadatas.append(metadata or {})
+                if label is not None:
+                    partitions[label]=[start, len(ids)]
+
+        if vectors is None:
+            np.save(staged("vectors.npy"), np.zeros((0, 0), dtype=dtype))
+        else:
+            vectors.flush()
+            del vectors
+
+        np.save(staged("norms.npy"), norms)
+        if dtype == "int8":
+            np.save(staged("scales.npy"), scales)
+        np.save(staged("offsets.npy"), np.asarray(offsets, dtype=np.int64))
+        with open(staged("metadata.json"), "w", encoding="utf-8") as f:
+            # dtype and partition_key let refresh() re-export with the same settings
+            json.dump({"ids":ids, "metadatas":metadatas, "partitions":partitions, "dtype":dtype, "partition_key":partition_key}, f)
+
+        names=["vectors.npy", "norms.npy", "offsets.npy", "chunks.bin"] + (["scales.npy"] if dtype == "int8" else [])
+        for name in names:
+            os.replace(staged(name), os.path.join(directory, name))
+        if dtype != "int8" and os.path.exists(os.path.join(directory, "scales.npy")):
+            os.remove(os.path.join(directory, "scales.npy"))
+        os.replace(staged("metadata.json"), os.path.join(directory, "metadata.json"))
+
+        return len(ids)
+
+    @staticmethod
+    def export_settings(directory):
+        """
+        Returns (dtype, partition_key) of the export in directory, or None
+        when there is no export.
+        """
+        try:
+            with open(os.path.join(directory, "metadata.json"), "r", encoding="utf-8") as f:
+                table=json.load(f)
+        except FileNotFoundError:
+            return None
+
+        dtype=table.get("dtype") or np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r").dtype.name
+        partition_key=table.get("partition_key")
+        if table.get("partitions") and partition_key is None:
+            # Exports written before the key was recorded
+            raise ValueError(f"{directory} is partitioned but does not record its partition key; "
+                             f"re-run scripts/export_flat_index.py with --partition-key")
+        return dtype, partition_key
+
+    @staticmethod
+    def refresh(collection, directory, batch_size=1000):
+        """
+        Re-exports collection to directory with the settings of the export
+        already there, so it keeps matching the collection after chunks are
+        added or deleted. Returns the number of chunks written, or None when
+        directory has no export.
+        """
+        settings=FlatIndex.export_settings(directory)
+        if settings is None:
+            return None
+        dtype, partition_key = settings
+        return FlatIndex.export(collection, directory, dtype=dtype, batch_size=batch_size, partition_key=partition_key)
+
+    def partition_range(self, partition):
+        if partition is None or not self.partitions:
+            return 0, len(self)
+        # An unknown partition of a partitioned export is empty
+        return tuple(self.partitions.get(partition, (0, 0)))
+
+    def distances(self, vector, start=0, end=None):
+        end=len(self) if end is None else end
+        query=np.asarray(vector, dtype=np.float32)
+        scores=np.empty(end - start, dtype=np.float32)
+        # Blocks keep the float32 upcast of a quantized matrix small
+        for block_start in range(start, end, self.block_size):
+            block_end=min(block_start + self.block_size, end)
+            block=np.asarray(self.vectors[block_start:block_end], dtype=np.float32)
+            block_scores=block @ query
+            if self.scales is not None:
+                block_scores*=self.scales[block_start:block_end]
+            scores[block_start - start:block_end - start]=block_scores
+        return self.norms[start:end] - 2 * scores + query @ query
+
+    def restored(self, start, end):
+        """
+        Returns rows start:end as the float32 vectors they stand for.
+        """
+        block=np.array(self.vectors[start:end], dtype=np.float32)
+        if self.scales is not None:
+            block*=self.scales[start:end, None]
+        return block
+
+    def search(self, vector, k=4, partition=None):
+        """
+        Returns [(position, distance)] of the k nearest chunks, nearest first,
+        optionally within one partition.
+        """
+        start, end = self.partition_range(partition)
+        if end <= start:
+            return []
+        distances=self.distances(vector, start, end)
+        k=min(k, len(distances))
+        nearest=np.argpartition(distances, k - 1)[:k]
+        nearest=nearest[np.argsort(distances[nearest])]
+        return [(start + int(position), float(distances[position])) for position in nearest]
+
+    def document(self, position):
+        text=self.chunks[self.offsets[position]:self.offsets[position + 1]].decode("utf-8")
+        return Document(page_content=text, metadata=dict(self.metadatas[position]))
@@ -0,0 +1,41 @@
+import os
+import json
+import uuid
+import datetime
+
+MANIFEST_FILENAME = "index_manifest.json"
+
+def manifest_path(persist_directory):
+    return os.path.join(persist_directory, MANIFEST_FILENAME)
+
+def read_index_manifest(persist_directory):
+    """
+    Returns the manifest of a persist directory, or None when it has none.
+    """
+    try:
+        with open(manifest_path(persist_directory), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_index_manifest(persist_directory, collection=None, changed_by=""):
+    """
+    Records a new index version for persist_directory. Every script that
+    changes a collection, or the indexes derived from it, calls this so
+    caches keyed by the version are invalidated.
+    """
+    manifest = {
+        "version": uuid.uuid4().hex,
+        "updated_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "chunks": collection.count() if collection is not None else None,
+        "changed_by": changed_by
+    }
+
+    os.makedirs(persist_directory, exist_ok=True)
+    # Write to a temporary file first so readers never see a partial manifest
+    tmp_path = manifest_path(persist_directory) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path(persist_directory))
+
+    return manifest
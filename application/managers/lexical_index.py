@@ -0,0 +1,130 @@
+import os
+import re
+import json
+import unicodedata
+import numpy as np
+from collections import Counter
+
+def tokenize(text):
+    # Lowercase and strip accents so "Área" and "area" match; numbers stay tokens ("Prop 400")
+    text=unicodedata.normalize("NFKD", text.lower())
+    text="".join(char for char in text if not unicodedata.combining(char))
+    return re.findall(r"\w+", text)
+
+class LexicalIndex():
+    """
+    BM25 inverted index over the chunks of a Chroma collection.
+
+    Postings are stored in compressed sparse row form: for term number t,
+    postings_docs[term_offsets[t]:term_offsets[t + 1]] are the chunks that
+    contain it and postings_freqs the matching term frequencies. The arrays
+    live in postings.npz; the vocabulary and chunk ids in terms.json. When
+    built with a partition_key, each chunk's partition label is stored too so
+    searches can be limited to one partition.
+    """
+    def __init__(self, directory, k1=1.5, b=0.75, *args, **kwargs):
+        self.directory=directory
+        self.k1=k1
+        self.b=b
+
+        with open(os.path.join(directory, "terms.json"), "r", encoding="utf-8") as f:
+            table=json.load(f)
+        self.ids=table["ids"]
+        self.terms={term:number for number, term in enumerate(table["terms"])}
+        self.partition_labels={label:number for number, label in enumerate(table.get("partitions", []))}
+
+        with np.load(os.path.join(directory, "postings.npz")) as arrays:
+            self.term_offsets=arrays["term_offsets"]
+            self.postings_docs=arrays["postings_docs"]
+            self.postings_freqs=arrays["postings_freqs"].astype(np.float32)
+            self.doc_lengths=arrays["doc_lengths"].astype(np.float32)
+            self.doc_partitions=arrays["doc_partitions"] if "doc_partitions" in arrays else None
+
+        self.average_length=float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+
+        super().__init__(*args,**kwargs)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def build(collection, directory, batch_size=1000, partition_key=None):
+        """
+        Indexes every chunk of a Chroma collection into directory. Returns
+        the number of chunks indexed.
+        """
+        os.makedirs(directory, exist_ok=True)
+        total=collection.count()
+
+        ids=[]
+        doc_lengths=[]
+        doc_labels=[]
+        postings={}
+        for offset in range(0, total, batch_size):
+            batch=collection.get(include=["documents", "metadatas"], limit=batch_size, offset=offset)
+            for chunk_id, text, metadata in zip(batch["ids"], batch["documents"], batch["metadatas"]):
+                tokens=tokenize(text or "")
+                for term, freq in Counter(tokens).items():
+                    postings.setdefault(term, []).append((len(ids), freq))
+                ids.append(chunk_id)
+                doc_lengths.append(len(tokens))
+                if partition_key is not None:
+                    doc_labels.append(str((metadata or {}).get(partition_key, "")))
+
+        terms=sorted(postings)
+        term_offsets=[0]
+        postings_docs=[]
+        postings_freqs=[]
+        for term in terms:
+            for doc, freq in postings[term]:
+                postings_docs.append(doc)
+                postings_freqs.append(min(freq, np.iinfo(np.uint16).max))
+            term_offsets.append(len(postings_docs))
+
+        arrays={
+            "term_offsets":np.asarray(term_offsets, dtype=np.int64),
+            "postings_docs":np.asarray(postings_docs, dtype=np.int32),
+            "postings_freqs":np.asarray(postings_freqs, dtype=np.uint16),
+            "doc_lengths":np.asarray(doc_lengths, dtype=np.int32)
+        }
+        labels=sorted(set(doc_labels))
+        if partition_key is not None:
+            numbers={label:number for number, label in enumerate(labels)}
+            arrays["doc_partitions"]=np.asarray([numbers[label] for label in doc_labels], dtype=np.int16)
+
+        np.savez_compressed(os.path.join(directory, "postings.npz"), **arrays)
+        with open(os.path.join(directory, "terms.json"), "w", encoding="utf-8") as f:
+            json.dump({"terms":terms, "ids":ids, "partitions":labels}, f)
+
+        return len(ids)
+
+    def scores(self, query):
+        scores=np.zeros(len(self), dtype=np.float32)
+        for term in set(tokenize(query)):
+            number=self.terms.get(term)
+            if number is None:
+                continue
+            start, end = self.term_offsets[number], self.term_offsets[number + 1]
+            docs=self.postings_docs[start:end]
+            freqs=self.postings_freqs[start:end]
+
+            idf=np.log(1 + (len(self) - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm=self.k1 * (1 - self.b + self.b * self.doc_lengths[docs] / self.average_length)
+            scores[docs]+=idf * freqs * (self.k1 + 1) / (freqs + norm)
+        return scores
+
+    def search(self, query, k=20, partition=None):
+        """
+        Returns [(chunk_id, score)] of the k best matching chunks, best first,
+        optionally within one partition. Chunks sharing no term with the query
+        are left out.
+        """
+        if len(self) == 0:
+            return []
+        scores=self.scores(query)
+        if partition is not None and self.doc_partitions is not None:
+            scores[self.doc_partitions != self.partition_labels.get(partition, -1)]=0
+        k=min(k, len(scores))
+        best=np.argpartition(-scores, k - 1)[:k]
+        best=best[np.argsort(-scores[best])]
+        return [(self.ids[position], float(scores[position])) for position in best if scores[position] > 0]
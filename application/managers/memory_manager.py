@@ -4,6 +4,8 @@ class MemoryManager:
     def __init__(self):
         self.sessions = {}
         self.message_counts = {}
+        # Rendered "human_readable<br>url" lines, shared across sessions
+        self.source_fragments = {}
 
     async def get_message_count(self, session_id):
         if session_id in self.message_counts:
@@ -78,21 +80,27 @@ class MemoryManager:
             return ""
     
 
+    def source_fragment(self, human_readable, url):
+        key = (human_readable, url)
+        fragment = self.source_fragments.get(key)
+        if fragment is None:
+            fragment = ". " + human_readable + "<br>" + url
+            self.source_fragments[key] = fragment
+        return fragment
+
     async def format_sources_as_html(self, source_list):
-        html = "Here are some of the sources I used for my previous answer:<br>"
-        has_items = False
+        parts = ["Here are some of the sources I used for my previous answer:<br>"]
         counter = 1
         for source in source_list:
             human_readable = source["human_readable"]
             url = source["url"]
             if human_readable:  # Skip if human_readable is an empty string
                 if url:
-                    html += "<br>" + str(counter)  + ". " + human_readable + "<br>" + url
-                    has_items=True
+                    parts.append("<br>" + str(counter) + self.source_fragment(human_readable, url))
                     counter+=1
 
-        if has_items:
-            return html
+        if counter > 1:
+            return "".join(parts)
         else:
             return "I did not use any specific sources in providing the information in the previous response."
 
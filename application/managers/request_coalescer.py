@@ -0,0 +1,66 @@
+import asyncio
+
+class RequestCoalescer():
+    """
+    Deduplicates identical in-flight work.
+
+    The first caller for a key starts the work; callers arriving while it is
+    still running await the same result instead of repeating it.
+    """
+    def __init__(self, *args, **kwargs):
+        self.in_flight={}
+        self.started=0
+        self.coalesced=0
+
+        super().__init__(*args,**kwargs)
+
+    def register(self, key, future):
+        self.in_flight[key]=future
+        self.started+=1
+        future.add_done_callback(lambda _: self.in_flight.pop(key, None))
+
+    def pending(self, key):
+        return self.in_flight.get(key)
+
+    async def join(self, key):
+        """
+        Awaits the in-flight result for key; returns None when nothing is
+        in flight.
+        """
+        future=self.in_flight.get(key)
+        if future is None:
+            return None
+
+        self.coalesced+=1
+        return await asyncio.shield(future)
+
+    def lead(self, key):
+        """
+        Registers the caller as the producer for key and returns the future
+        it must resolve with set_result or set_exception.
+        """
+        future=asyncio.get_running_loop().create_future()
+        self.register(key, future)
+        return future
+
+    async def run(self, key, work):
+        """
+        Returns the result of work() for key, sharing one call between
+        concurrent callers.
+        """
+        future=self.in_flight.get(key)
+        if future is None:
+            future=asyncio.ensure_future(work())
+            self.register(key, future)
+        else:
+            self.coalesced+=1
+
+        # Shielded so a disconnecting client does not cancel work other requests wait on
+        return await asyncio.shield(future)
+
+    def stats(self):
+        return {
+            "started":self.started,
+            "coalesced":self.coalesced,
+            "in_flight":len(self.in_flight)
+        }
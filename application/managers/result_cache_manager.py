@@ -0,0 +1,135 @@
+import os
+import json
+import asyncio
+import hashlib
+from collections import OrderedDict
+from managers.request_coalescer import RequestCoalescer
+
+class ResultCacheManager():
+    """
+    Caches generated responses by a hash of the model id and the LLM payload.
+
+    Entries live in a bounded in-memory LRU and, when disk_directory is set,
+    in one JSON file per key so they survive restarts. Concurrent requests
+    for the same key share a single generation.
+    """
+    def __init__(self, max_entries=500, disk_directory=None, *args, **kwargs):
+        self.max_entries=max_entries
+        self.disk_directory=disk_directory
+        if disk_directory:
+            os.makedirs(disk_directory, exist_ok=True)
+
+        self.entries=OrderedDict()
+        self.coalescer=RequestCoalescer()
+        self.hits=0
+        self.misses=0
+
+        super().__init__(*args,**kwargs)
+
+    def make_key(self, model_id, llm_body):
+        return hashlib.sha256(f"{model_id}\n{llm_body}".encode("utf-8")).hexdigest()
+
+    def disk_path(self, key):
+        return os.path.join(self.disk_directory, f"{key}.json")
+
+    def read_disk(self, key):
+        try:
+            with open(self.disk_path(key), "r", encoding="utf-8") as f:
+                return json.load(f)["value"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def write_disk(self, key, value):
+        # Write to a temporary file first so readers never see a partial entry
+        tmp_path=self.disk_path(key) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"value":value}, f)
+        os.replace(tmp_path, self.disk_path(key))
+
+    async def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        if self.disk_directory:
+            value=await asyncio.to_thread(self.read_disk, key)
+            if value is not None:
+                self.remember(key, value)
+                return value
+
+        return None
+
+    def remember(self, key, value):
+        self.entries[key]=value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def set(self, key, value):
+        self.remember(key, value)
+        if self.disk_directory:
+            try:
+                await asyncio.to_thread(self.write_disk, key, value)
+            except OSError as e:
+                print(f"Error writing result cache entry: {e}")
+
+    async def lookup(self, model_id, llm_body):
+        """
+        Returns the cached response, waiting on an identical in-flight
+        generation if there is one; returns None when neither exists.
+        """
+        key=self.make_key(model_id, llm_body)
+
+        value=await self.get(key)
+        if value is not None:
+            self.hits+=1
+            return value
+
+        if self.coalescer.pending(key) is not None:
+            return await self.coalescer.join(key)
+
+        self.misses+=1
+        return None
+
+    async def store(self, model_id, llm_body, value):
+        await self.set(self.make_key(model_id, llm_body), value)
+
+    def lead(self, model_id, llm_body):
+        """
+        Registers the caller as the producer of the payload's response, so
+        identical lookups wait for it instead of generating again. The
+        caller resolves the returned future and stores the response.
+        """
+        return self.coalescer.lead(self.make_key(model_id, llm_body))
+
+    async def get_or_generate(self, model_id, llm_body, generate):
+        """
+        Returns the cached response for the payload or awaits generate() to
+        produce it. generate is only called once for concurrent identical
+        payloads.
+        """
+        key=self.make_key(model_id, llm_body)
+
+        value=await self.get(key)
+        if value is not None:
+            self.hits+=1
+            return value
+
+        if self.coalescer.pending(key) is None:
+            self.misses+=1
+
+        return await self.coalescer.run(key, lambda: self.generate_and_store(key, generate))
+
+    async def generate_and_store(self, key, generate):
+        value=await generate()
+        await self.set(key, value)
+        return value
+
+    def stats(self):
+        return {
+            "hits":self.hits,
+            "misses":self.misses,
+            "shared":self.coalescer.coalesced,
+            "entries":len(self.entries),
+            "in_flight":len(self.coalescer.in_flight)
+        }
@@ -0,0 +1,111 @@
+import re
+import numpy as np
+import mappings.custom_tags as custom_tags
+
+# Phrasings common in prompt injection attempts, in English and Spanish. Ordinary questions use them too
+# ("override all previous rules on groundwater pumping"), so a match only sends the query to the LLM check
+INJECTION_PATTERNS = [
+    r"\b(ignore|disregard|forget|override|bypass)\b.{0,20}\b(previous|prior|above|earlier|all|your|system)\b.{0,20}\b(instructions?|prompts?|rules|directions|guidelines)\b",
+    r"\b(system|developer|hidden)\s+(prompt|message|instructions?)\b",
+    r"\b(reveal|print|show|repeat|output)\b.{0,30}\byour\s+(instructions|prompt|rules|guidelines)\b",
+    r"\byou\s+are\s+(now|no\s+longer)\b",
+    r"\b(pretend|act)\s+(to\s+be|as\s+if)\b",
+    r"\bfrom\s+now\s+on\b.{0,40}\b(you|respond|answer)\b",
+    r"\b(jailbreak|dan\s+mode|developer\s+mode)\b",
+    r"\b(ignora|olvida|omite|descarta)\b.{0,40}\b(instrucciones|reglas|indicaciones)\s+(anteriores|previas)\b",
+    r"\b(ignora|olvida|omite|descarta)\b.{0,20}\b(tus|todas\s+las)\s+(instrucciones|reglas|indicaciones)\b",
+    r"\b(ahora\s+eres|act[uú]a\s+como\s+si)\b",
+]
+
+# Role and app tags have no place in a user query; a match is rejected outright
+INJECTION_TAG_PATTERNS = [
+    r"</?\s*(system|assistant|user)\s*>",
+    # Tags the app itself uses to mark synthetic turns
+    r"</?\s*(" + "|".join(custom_tags.tags.keys()) + r")\s*>",
+]
+
+class SafetyPrefilter():
+    """
+    Local first stage of the intent safety check.
+
+    Queries carrying role or app tags are rejected as prompt injection;
+    queries phrased like an injection attempt are left to the LLM intent
+    check. Topic relevance is scored as the cosine similarity between the
+    query embedding and the centroid of each knowledge base. Queries at or
+    above related_threshold are accepted and queries below
+    unrelated_threshold are rejected without an LLM call; only the band in
+    between is left to the LLM intent check.
+    """
+    def __init__(self, embedding_manager, knowledge_bases, unrelated_threshold=0.75, related_threshold=0.82, *args, **kwargs):
+        self.embedding_manager=embedding_manager
+        self.knowledge_bases=knowledge_bases
+        self.unrelated_threshold=unrelated_threshold
+        self.related_threshold=related_threshold
+        self.injection_pattern=re.compile("|".join(f"(?:{pattern})" for pattern in INJECTION_PATTERNS), re.IGNORECASE | re.DOTALL)
+        self.injection_tag_pattern=re.compile("|".join(f"(?:{pattern})" for pattern in INJECTION_TAG_PATTERNS), re.IGNORECASE)
+
+        self.accepted=0
+        self.rejected_injection=0
+        self.rejected_unrelated=0
+        self.escalated=0
+
+        super().__init__(*args,**kwargs)
+
+    def has_injection_tags(self, user_query):
+        return self.injection_tag_pattern.search(user_query) is not None
+
+    def is_prompt_injection(self, user_query):
+        """
+        Returns True when the query is phrased like a prompt injection
+        attempt. Not conclusive on its own.
+        """
+        return self.injection_pattern.search(user_query) is not None
+
+    async def topic_similarity(self, user_query):
+        centroids=[await knowledge_base.topic_centroid() for knowledge_base in self.knowledge_bases]
+        centroids=[centroid for centroid in centroids if centroid is not None]
+        if not centroids:
+            return None
+
+        vector=await self.embedding_manager.embed_query(user_query)
+        vector=vector / max(np.linalg.norm(vector), 1e-12)
+
+        return max(float(centroid @ vector) for centroid in centroids)
+
+    async def classify(self, user_query):
+        """
+        Returns the intent verdict as a dict shaped like the output of
+        get_intent_system_prompt, or None when the query is ambiguous and
+        needs the LLM check.
+        """
+        if self.has_injection_tags(user_query):
+            self.rejected_injection+=1
+            return {"user_intent":0, "prompt_injection":1, "unrelated_topic":0}
+
+        if self.is_prompt_injection(user_query):
+            self.escalated+=1
+            return None
+
+        similarity=await self.topic_similarity(user_query)
+        if similarity is None:
+            self.escalated+=1
+            return None
+
+        if similarity < self.unrelated_threshold:
+            self.rejected_unrelated+=1
+            return {"user_intent":0, "prompt_injection":0, "unrelated_topic":1}
+
+        if similarity >= self.related_threshold:
+            self.accepted+=1
+            return {"user_intent":0, "prompt_injection":0, "unrelated_topic":0}
+
+        self.escalated+=1
+        return None
+
+    def stats(self):
+        return {
+            "accepted":self.accepted,
+            "rejected_injection":self.rejected_injection,
+            "rejected_unrelated":self.rejected_unrelated,
+            "escalated":self.escalated
+        }
@@ -0,0 +1,101 @@
+import re
+import time
+import numpy as np
+from collections import OrderedDict
+
+class SemanticCacheManager():
+    """
+    Caches chat answers by the meaning of the query.
+
+    Queries are embedded through the shared EmbeddingManager; a lookup returns the stored answer of
+    the most similar cached query when the cosine similarity clears the
+    threshold. Each namespace (one per knowledge base language) is an LRU with
+    a time-to-live on every entry.
+    """
+    def __init__(self, embedding_manager, similarity_threshold=0.95, ttl_seconds=86400, max_entries=1000, *args, **kwargs):
+        self.embedding_manager=embedding_manager
+        self.similarity_threshold=similarity_threshold
+        self.ttl_seconds=ttl_seconds
+        self.max_entries=max_entries
+
+        self.namespaces={}
+        self.hits=0
+        self.misses=0
+
+        super().__init__(*args,**kwargs)
+
+    def normalize_query(self, user_query):
+        normalized=re.sub(r'[^\w\s]', ' ', user_query.lower())
+        return re.sub(r'\s+', ' ', normalized).strip()
+
+    async def embed(self, user_query):
+        # Same text as retrieval, so the vector is shared with the knowledge base search
+        vector=await self.embedding_manager.embed_query(user_query)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def get_namespace(self, namespace):
+        return self.namespaces.setdefault(namespace, OrderedDict())
+
+    def evict_expired(self, entries):
+        now=time.monotonic()
+        expired=[key for key, entry in entries.items() if now - entry["created_at"] > self.ttl_seconds]
+        for key in expired:
+            del entries[key]
+
+    async def lookup(self, user_query, namespace):
+        """
+        Returns the cached entry for a query similar to user_query, or None.
+
+        Entries hold the "response_content" and retrieved "docs" of the
+        original answer.
+        """
+        entries=self.get_namespace(namespace)
+        self.evict_expired(entries)
+
+        normalized_query=self.normalize_query(user_query)
+        if not entries or not normalized_query:
+            self.misses+=1
+            return None
+
+        if normalized_query in entries:
+            best_key=normalized_query
+        else:
+            vector=await self.embed(user_query)
+            keys=list(entries.keys())
+            matrix=np.stack([entries[key]["vector"] for key in keys])
+            similarities=matrix @ vector
+            best=int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses+=1
+                return None
+            best_key=keys[best]
+
+        entries.move_to_end(best_key)
+        self.hits+=1
+        return entries[best_key]
+
+    async def store(self, user_query, namespace, response_content, docs):
+        normalized_query=self.normalize_query(user_query)
+        if not normalized_query:
+            return
+
+        entries=self.get_namespace(namespace)
+        entries[normalized_query]={
+            "vector":await self.embed(user_query),
+            "response_content":response_content,
+            "docs":docs,
+            "created_at":time.monotonic()
+        }
+        entries.move_to_end(normalized_query)
+
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    def stats(self):
+        lookups=self.hits + self.misses
+        return {
+            "hits":self.hits,
+            "misses":self.misses,
+            "hit_rate":self.hits / lookups if lookups else 0.0,
+            "entries":{namespace:len(entries) for namespace, entries in self.namespaces.items()}
+        }
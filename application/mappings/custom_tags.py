@@ -5,4 +5,6 @@ tags = {
     "OG_QUERY":["<OG_QUERY>","</OG_QUERY>"],
     "SECURITY_CHECK":["<SECURITY_CHECK>","</SECURITY_CHECK>"],
 }
-allow_list = list(tags.keys())
\ No newline at end of file
+allow_list = list(tags.keys())
+# Tags of the synthetic user turns created by the follow-up buttons
+followup_tags = ["SOURCE_REQUEST","NEXTSTEPS_REQUEST","MOREDETAIL_REQUEST"]
\ No newline at end of file
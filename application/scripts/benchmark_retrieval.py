@@ -0,0 +1,344 @@
+# Benchmarks retrieval quality against latency for the ChromaManager configurations.
+# Builds throwaway English and Spanish collections with a deterministic hashing embedder, so it runs offline
+# and two runs on the same commit rank identically. For every configuration it reports recall@k, MRR,
+# p50/p95/p99 search latency, resident memory and index size, and writes a JSON report to diff between commits.
+# Run from the application directory:
+#   python scripts/benchmark_retrieval.py
+#   python scripts/benchmark_retrieval.py --output benchmark_report.json --repeat 5
+#   python scripts/benchmark_retrieval.py --english-documents newData --spanish-documents newData/spanish
+#   python scripts/benchmark_retrieval.py --only flat
+
+import os
+import re
+import gc
+import sys
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import argparse
+import datetime
+import resource
+import tempfile
+import subprocess
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import Chroma
+from langchain_community.document_loaders import TextLoader, PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# Add the application directory to the Python path to access managers
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.chroma_manager import ChromaManager
+from managers.flat_index import FlatIndex
+from managers.lexical_index import LexicalIndex, tokenize
+from managers.adaptive_top_k import AdaptiveTopK
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_fixtures.json")
+
+# How the collections are built; every search configuration runs against every build it applies to
+BUILDS = [
+    {"name": "chunk1500", "chunk_size": 1500, "chunk_overlap": 150, "hnsw": {}},
+    {"name": "chunk750", "chunk_size": 750, "chunk_overlap": 75, "hnsw": {}},
+    {"name": "chunk1500-hnsw-m32-ef64", "chunk_size": 1500, "chunk_overlap": 150, "hnsw": {"hnsw:M": 32, "hnsw:construction_ef": 200, "hnsw:search_ef": 64}},
+]
+
+# How each build is searched; builds with HNSW parameters only run the Chroma searches
+SEARCHES = [
+    {"name": "chroma-k4", "backend": "chroma", "search_mode": "vector", "k": 4},
+    {"name": "chroma-k8", "backend": "chroma", "search_mode": "vector", "k": 8},
+    {"name": "chroma-hybrid-k4", "backend": "chroma", "search_mode": "hybrid", "k": 4},
+    {"name": "chroma-adaptive", "backend": "chroma", "search_mode": "vector", "k": 4, "adaptive_top_k": {"min_k": 2, "max_k": 8}},
+    {"name": "flat-float32-k4", "backend": "flat", "dtype": "float32", "search_mode": "vector", "k": 4},
+    {"name": "flat-int8-k4", "backend": "flat", "dtype": "int8", "search_mode": "vector", "k": 4},
+    {"name": "flat-int8-rescore20-k4", "backend": "flat", "dtype": "int8", "search_mode": "vector", "k": 4, "rescore_candidates": 20},
+]
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic stand-in for the OpenAI embeddings: accent-folded words
+    and word bigrams hashed into a signed bag of features, L2-normalized.
+    """
+    def __init__(self, dimensions=512, *args, **kwargs):
+        self.dimensions=dimensions
+        super().__init__(*args,**kwargs)
+
+    def embed(self, text):
+        vector=np.zeros(self.dimensions, dtype=np.float32)
+        tokens=tokenize(text)
+        for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+            digest=hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value=int.from_bytes(digest, "little")
+            vector[value % self.dimensions]+=1.0 if value & (1 << 63) else -1.0
+        norm=np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed(text)
+
+def source_name(source):
+    # Sources were uploaded from Windows and Linux, so split on either separator
+    return re.split(r"[\\/]+", source)[-1]
+
+def load_fixture_corpus(fixtures, language):
+    return [
+        Document(page_content=entry["text"], metadata={"source": entry["source"], "name": source_name(entry["source"])})
+        for entry in fixtures.get("corpus", [])
+        if entry["language"] == language
+    ]
+
+def load_directory_corpus(directory):
+    # Loads the same files, with the same metadata, as ingestion/pipeline.py
+    documents = []
+    for root, _, files in os.walk(directory):
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            if file.lower().endswith(".txt"):
+                loader = TextLoader(file_path, encoding="utf-8")
+            elif file.lower().endswith(".pdf"):
+                loader = PyPDFLoader(file_path)
+            else:
+                continue
+            for doc in loader.load():
+                doc.metadata["source"] = file_path
+                doc.metadata["name"] = file
+                documents.append(doc)
+    return documents
+
+def directory_size(directory):
+    if not os.path.isdir(directory):
+        return 0
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(directory)
+        for name in files
+    )
+
+def resident_memory():
+    """
+    Returns (current, peak) resident set size of this process in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        current = peak
+    return current, max(current, peak)
+
+def build_collection(documents, persist_directory, embeddings, build):
+    """
+    Splits documents as the ingestion scripts do and stores them in a new
+    collection at persist_directory, with the BM25 index beside it.
+    """
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=build["chunk_size"], chunk_overlap=build["chunk_overlap"])
+    chunks = text_splitter.split_documents(documents)
+    # Chroma reads HNSW parameters from the collection metadata when the collection is created
+    db = Chroma(persist_directory=persist_directory, embedding_function=embeddings, collection_metadata=build["hnsw"] or None)
+    ids = [f"{source_name(chunk.metadata['source'])}-{position}" for position, chunk in enumerate(chunks)]
+    for start in range(0, len(chunks), 500):
+        db.add_documents(documents=chunks[start:start + 500], ids=ids[start:start + 500])
+    LexicalIndex.build(db._collection, os.path.join(persist_directory, "lexical_index"))
+    return len(chunks)
+
+def index_size(persist_directory, search):
+    flat_directory = os.path.join(persist_directory, "flat_index")
+    lexical_directory = os.path.join(persist_directory, "lexical_index")
+    if search["backend"] == "flat":
+        size = directory_size(flat_directory)
+    else:
+        size = directory_size(persist_directory) - directory_size(flat_directory) - directory_size(lexical_directory)
+    if search["search_mode"] == "hybrid":
+        size += directory_size(lexical_directory)
+    return size
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+def score_query(results, relevant_sources, k):
+    """
+    Returns (recall, reciprocal rank) of the relevant sources among the
+    sources of the retrieved chunks, counting each source once.
+    """
+    ranked_sources = []
+    for _, doc in results[:k]:
+        name = source_name(doc.metadata.get("source", ""))
+        if name not in ranked_sources:
+            ranked_sources.append(name)
+
+    relevant = set(relevant_sources)
+    recall = len(relevant & set(ranked_sources)) / len(relevant)
+    reciprocal_rank = next((1 / rank for rank, name in enumerate(ranked_sources, start=1) if name in relevant), 0.0)
+    return recall, reciprocal_rank
+
+async def run_queries(managers, queries, repeat):
+    """
+    Runs every query once to warm up, then repeat more times timing each
+    embedding and search. Returns per-query rows and latencies in ms.
+    """
+    rows = []
+    latencies = []
+    for round_number in range(repeat + 1):
+        for query in queries:
+            manager = managers[query["language"]]
+            policy = manager.top_k_policies.get(query["language"])
+            started = time.perf_counter()
+            vector = await manager.embed_query(query["query"])
+            results, _ = manager.search(query["query"], vector, policy=policy)
+            elapsed = (time.perf_counter() - started) * 1000
+            if round_number == 0:
+                rows.append((query, results))
+            else:
+                latencies.append((query["language"], elapsed))
+    return rows, latencies
+
+def summarize(rows, latencies, languages):
+    summary = {}
+    for language in languages:
+        scored = [
+            score_query(results, query["relevant_sources"], len(results)) + (len(results),)
+            for query, results in rows
+            if language == "all" or query["language"] == language
+        ]
+        timings = [elapsed for query_language, elapsed in latencies if language == "all" or query_language == language]
+        if not scored:
+            continue
+        summary[language] = {
+            "queries": len(scored),
+            "recall_at_k": round(sum(recall for recall, _, _ in scored) / len(scored), 4),
+            "mrr": round(sum(rank for _, rank, _ in scored) / len(scored), 4),
+            "average_k": round(sum(k for _, _, k in scored) / len(scored), 3),
+            "latency_ms": {
+                "p50": percentile(timings, 50),
+                "p95": percentile(timings, 95),
+                "p99": percentile(timings, 99),
+                "mean": round(float(np.mean(timings)), 3) if timings else None
+            }
+        }
+    return summary
+
+def run_search(directories, embeddings, search, queries, repeat):
+    gc.collect()
+    rss_before, _ = resident_memory()
+
+    managers = {}
+    for language, persist_directory in directories.items():
+        if search["backend"] == "flat":
+            # Re-export for this search's precision; the flat index is a derived copy of the collection
+            flat_directory = os.path.join(persist_directory, "flat_index")
+            shutil.rmtree(flat_directory, ignore_errors=True)
+            FlatIndex.export(Chroma(persist_directory=persist_directory)._collection, flat_directory, dtype=search.get("dtype", "float32"))
+        policies = {language: AdaptiveTopK(**search["adaptive_top_k"])} if "adaptive_top_k" in search else None
+        managers[language] = ChromaManager(
+            persist_directory,
+            embedding_function=embeddings,
+            backend=search["backend"],
+            search_mode=search["search_mode"],
+            k=search["k"],
+            rescore_candidates=search.get("rescore_candidates", 0),
+            top_k_policies=policies
+        )
+
+    rows, latencies = asyncio.run(run_queries(managers, queries, repeat))
+    rss_after, peak = resident_memory()
+
+    result = {
+        "metrics": summarize(rows, latencies, ["all"] + sorted(directories)),
+        "memory_mb": {
+            "rss": round(rss_after / 2**20, 1),
+            "rss_delta": round((rss_after - rss_before) / 2**20, 1),
+            "peak_rss": round(peak / 2**20, 1)
+        },
+        "index_size_bytes": {language: index_size(persist_directory, search) for language, persist_directory in directories.items()}
+    }
+    del managers
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency across index and search configurations.")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="JSON file with labelled queries and a fallback corpus")
+    parser.add_argument("--english-documents", default=None, help="directory of English PDFs/text files to index instead of the fixture corpus")
+    parser.add_argument("--spanish-documents", default=None, help="directory of Spanish PDFs/text files to index instead of the fixture corpus")
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over the queries after one warm-up pass")
+    parser.add_argument("--dimensions", type=int, default=512, help="size of the hashing embeddings")
+    parser.add_argument("--only", default=None, help="run only configurations whose name contains this text")
+    parser.add_argument("--work-directory", default=None, help="where to build the collections; a temporary directory by default")
+    args = parser.parse_args()
+
+    with open(args.fixtures, "r", encoding="utf-8") as f:
+        fixtures = json.load(f)
+    queries = fixtures["queries"]
+    corpora = {
+        "en": load_directory_corpus(args.english_documents) if args.english_documents else load_fixture_corpus(fixtures, "en"),
+        "es": load_directory_corpus(args.spanish_documents) if args.spanish_documents else load_fixture_corpus(fixtures, "es")
+    }
+    corpora = {language: documents for language, documents in corpora.items() if documents}
+    queries = [query for query in queries if query["language"] in corpora]
+
+    embeddings = HashingEmbeddings(args.dimensions)
+    work_directory = args.work_directory or tempfile.mkdtemp(prefix="waterbot-benchmark-")
+    results = []
+    try:
+        for build in BUILDS:
+            searches = [
+                search for search in SEARCHES
+                if (not build["hnsw"] or search["backend"] == "chroma")
+                and (args.only is None or args.only in f"{build['name']}/{search['name']}")
+            ]
+            if not searches:
+                continue
+
+            directories = {language: os.path.join(work_directory, build["name"], language) for language in corpora}
+            chunks = {}
+            started = time.perf_counter()
+            for language, persist_directory in directories.items():
+                chunks[language] = build_collection(corpora[language], persist_directory, embeddings, build)
+            build_seconds = round(time.perf_counter() - started, 3)
+
+            for search in searches:
+                name = f"{build['name']}/{search['name']}"
+                print(f"Running {name}...")
+                result = run_search(directories, embeddings, search, queries, args.repeat)
+                overall = result["metrics"]["all"]
+                print(f"  recall@k {overall['recall_at_k']:.4f}  MRR {overall['mrr']:.4f}  "
+                      f"p50 {overall['latency_ms']['p50']} ms  p95 {overall['latency_ms']['p95']} ms  p99 {overall['latency_ms']['p99']} ms")
+                results.append(dict(
+                    name=name,
+                    build={key: value for key, value in build.items() if key != "name"},
+                    search={key: value for key, value in search.items() if key != "name"},
+                    chunks=chunks,
+                    build_seconds=build_seconds,
+                    **result
+                ))
+    finally:
+        if args.work_directory is None:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+    report = {
+        "generated_at": datetime.datetime.utcnow().isoformat() + "Z",
+        "commit": git_commit(),
+        "embeddings": f"hashing-{args.dimensions}",
+        "fixtures": os.path.relpath(args.fixtures),
+        "queries": len(queries),
+        "repeat": args.repeat,
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"Wrote {len(results)} configurations to {args.output}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# Builds the BM25 index read when RETRIEVAL_MODE=hybrid.
+# The ingestion scripts rebuild it after adding documents; to rebuild by hand, run from the application directory:
+#   python scripts/build_lexical_index.py
+#   python scripts/build_lexical_index.py docs/chroma/spanish
+#   python scripts/build_lexical_index.py --partition-key lang docs/chroma_unified/
+
+import os
+import sys
+import argparse
+from langchain_community.vectorstores import Chroma
+
+# Add the application directory to the Python path to access managers
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.lexical_index import LexicalIndex
+from managers.index_manifest import write_index_manifest
+
+def build_lexical_index(persist_directory, db=None, partition_key=None):
+    if db is None:
+        db = Chroma(persist_directory=persist_directory)
+    directory = os.path.join(persist_directory, "lexical_index")
+    count = LexicalIndex.build(db._collection, directory, partition_key=partition_key)
+    print(f"Indexed {count} chunks from {persist_directory} into {directory}.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Build BM25 indexes over Chroma collections.")
+    parser.add_argument("persist_directories", nargs="*", default=["docs/chroma/", "docs/chroma/spanish"])
+    parser.add_argument("--partition-key", default=None, help="metadata field to partition searches by, e.g. lang")
+    args = parser.parse_args()
+
+    for persist_directory in args.persist_directories:
+        build_lexical_index(persist_directory, partition_key=args.partition_key)
+        write_index_manifest(persist_directory, changed_by="build_lexical_index.py")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# Compares a flat index export (scripts/export_flat_index.py) with the Chroma collection it came from.
+# Reports recall@k of the flat index against Chroma's results, with and without full-precision re-scoring,
+# plus search latency and the on-disk size of both.
+# Run from the application directory:
+#   python scripts/compare_index_recall.py
+#   python scripts/compare_index_recall.py docs/chroma/spanish --k 4 --rescore-candidates 20 --queries 200
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Add the application directory to the Python path to access managers
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.chroma_manager import ChromaManager
+
+def directory_size(directory):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, files in os.walk(directory)
+        for name in files
+    )
+
+def sample_queries(collection, count, seed):
+    """
+    Builds query vectors as midpoints of random pairs of stored chunk
+    embeddings, so no query is itself an indexed vector.
+    """
+    total = collection.count()
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(total, size=(count, 2))
+    queries = []
+    for first, second in picks:
+        a = collection.get(include=["embeddings"], limit=1, offset=int(first))["embeddings"][0]
+        b = collection.get(include=["embeddings"], limit=1, offset=int(second))["embeddings"][0]
+        queries.append((np.asarray(a, dtype=np.float32) + np.asarray(b, dtype=np.float32)) / 2)
+    return queries
+
+def measure(manager, queries, truth, k):
+    hits = 0
+    started = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        found = [chunk_id for chunk_id, _, _ in manager.vector_search(query, k)]
+        hits += len(set(found) & expected)
+    elapsed = time.perf_counter() - started
+    return hits / (len(queries) * k), elapsed / len(queries) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recall@k of a flat index export against Chroma.")
+    parser.add_argument("persist_directory", nargs="?", default="docs/chroma/")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--rescore-candidates", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    chroma = ChromaManager(args.persist_directory, embedding_function=None)
+    flat = ChromaManager(args.persist_directory, embedding_function=None, backend="flat", rescore_candidates=args.rescore_candidates)
+    if flat.flat_index is None:
+        print(f"No flat index under {args.persist_directory}; run scripts/export_flat_index.py first.")
+        return
+    collection = chroma.vectordb._collection
+    if collection.count() == 0:
+        print(f"{args.persist_directory} has no chunks.")
+        return
+
+    queries = sample_queries(collection, args.queries, args.seed)
+    truth = [{chunk_id for chunk_id, _, _ in chroma.vector_search(query, args.k)} for query in queries]
+
+    _, chroma_ms = measure(chroma, queries, truth, args.k)
+    flat.rescore_candidates = 0
+    recall, flat_ms = measure(flat, queries, truth, args.k)
+    flat.rescore_candidates = args.rescore_candidates
+    rescored_recall, rescored_ms = measure(flat, queries, truth, args.k)
+
+    flat_directory = flat.flat_index_directory()
+    print(f"Flat index: {flat.flat_index.vectors.dtype}, {len(flat.flat_index)} chunks")
+    print(f"Size: flat index {directory_size(flat_directory) / 2**20:.1f} MiB, "
+          f"Chroma {(directory_size(args.persist_directory) - directory_size(flat_directory)) / 2**20:.1f} MiB")
+    print(f"Chroma search: {chroma_ms:.2f} ms/query")
+    print(f"recall@{args.k}: {recall:.4f} ({flat_ms:.2f} ms/query)")
+    if flat.flat_index.quantized:
+        print(f"recall@{args.k} with {args.rescore_candidates} re-scored candidates: {rescored_recall:.4f} ({rescored_ms:.2f} ms/query)")
+
+if __name__ == "__main__":
+    main()
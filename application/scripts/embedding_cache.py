@@ -0,0 +1,53 @@
+# Inspects and garbage-collects the chunk embedding cache used by the ingestion scripts.
+# gc keeps only the vectors of chunks still stored in the given collections.
+# Run from the application directory:
+#   python scripts/embedding_cache.py stats
+#   python scripts/embedding_cache.py gc
+#   python scripts/embedding_cache.py gc --dry-run docs/chroma/ docs/chroma/spanish docs/chroma_unified/
+
+import os
+import sys
+import argparse
+from langchain_community.vectorstores import Chroma
+
+# Add the application directory to the Python path to access ingestion
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingestion.embedding_cache import EmbeddingCache, cache_key
+
+def live_keys(persist_directories, model_name, batch_size=1000):
+    keys = set()
+    for persist_directory in persist_directories:
+        collection = Chroma(persist_directory=persist_directory)._collection
+        total = collection.count()
+        for offset in range(0, total, batch_size):
+            batch = collection.get(include=["documents"], limit=batch_size, offset=offset)
+            keys.update(cache_key(model_name, text or "") for text in batch["documents"])
+        print(f"{persist_directory}: {total} chunks")
+    return keys
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or garbage-collect the chunk embedding cache.")
+    parser.add_argument("command", choices=["stats", "gc"])
+    parser.add_argument("persist_directories", nargs="*", default=["docs/chroma/", "docs/chroma/spanish"])
+    parser.add_argument("--cache-directory", default="docs/embedding_cache/")
+    parser.add_argument("--model", default="text-embedding-ada-002", help="embedding model whose vectors are kept")
+    parser.add_argument("--dry-run", action="store_true", help="only count what gc would drop")
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(args.cache_directory)
+    stats = cache.stats()
+    print(f"{args.cache_directory}: {stats['entries']} vectors, {stats['bytes'] / 2**20:.1f} MiB")
+    if args.command == "stats":
+        return
+
+    keep = live_keys(args.persist_directories, args.model)
+    if args.dry_run:
+        unused = sum(1 for key in cache.offsets if key not in keep)
+        print(f"gc would drop {unused} of {len(cache)} vectors.")
+        return
+    kept, dropped, reclaimed = cache.gc(keep)
+    print(f"Kept {kept} vectors, dropped {dropped}, reclaimed {reclaimed / 2**20:.1f} MiB.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# Exports the Chroma collections to the flat index read when RETRIEVAL_BACKEND=flat.
+# Run from the application directory after adding documents, e.g.:
+#   python scripts/export_flat_index.py
+#   python scripts/export_flat_index.py --dtype float16 docs/chroma/spanish
+#   python scripts/export_flat_index.py --dtype int8
+#   python scripts/export_flat_index.py --partition-key lang docs/chroma_unified/
+# With RETRIEVAL_BACKEND=flat the app does not open the Chroma store itself (chroma.sqlite3 and its segment
+# folders) unless FLAT_INDEX_RESCORE_CANDIDATES is set, so an image can ship the flat_index folders without it.
+
+import os
+import sys
+import argparse
+from langchain_community.vectorstores import Chroma
+
+# Add the application directory to the Python path to access managers
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.flat_index import FlatIndex
+from managers.index_manifest import write_index_manifest
+
+def export_collection(persist_directory, dtype, partition_key=None):
+    db = Chroma(persist_directory=persist_directory)
+    directory = os.path.join(persist_directory, "flat_index")
+    count = FlatIndex.export(db._collection, directory, dtype=dtype, partition_key=partition_key)
+    print(f"Exported {count} chunks from {persist_directory} to {directory} ({dtype}).")
+    write_index_manifest(persist_directory, db._collection, changed_by="export_flat_index.py")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Chroma collections to flat vector indexes.")
+    parser.add_argument("persist_directories", nargs="*", default=["docs/chroma/", "docs/chroma/spanish"])
+    parser.add_argument("--dtype", choices=["float32", "float16", "int8"], default="float32")
+    parser.add_argument("--partition-key", default=None, help="metadata field to group rows by, e.g. lang")
+    args = parser.parse_args()
+
+    for persist_directory in args.persist_directories:
+        export_collection(persist_directory, args.dtype, args.partition_key)
+
+if __name__ == "__main__":
+    main()
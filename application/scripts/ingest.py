@@ -0,0 +1,84 @@
+# Ingests source files into the Chroma collections described in ingestion/collections.json.
+# Each collection config gives its language, source directory and file filters, persist directory, chunker and
+# embedding model. New and changed files are embedded, removed files' chunks deleted, unchanged files skipped.
+# Paths are relative to the application directory, whatever directory this is run from:
+#   python scripts/ingest.py --dry-run
+#   python scripts/ingest.py english spanish --stats ingest_stats.json
+#   python scripts/ingest.py english --files newData/2023-23127.pdf
+#   python scripts/ingest.py spanish --reingest --embedding-workers 8
+
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+APPLICATION_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Add the application directory to the Python path to access managers and ingestion
+sys.path.append(APPLICATION_DIRECTORY)
+
+from ingestion.collections import DEFAULT_CONFIG_PATH, load_collection_configs, ingest_collection
+
+def print_summary(reports):
+    print(f"{'collection':<12} {'new':>5} {'changed':>8} {'removed':>8} {'unchanged':>10} {'chunks':>8} {'deleted':>8} {'failed':>7} {'chunks/s':>9}")
+    for report in reports:
+        plan = report["plan"]
+        print(f"{report['collection']:<12} {plan['new']:>5} {plan['changed']:>8} {plan['removed']:>8} {plan['unchanged']:>10} "
+              f"{report.get('chunks_written', 0):>8} {report.get('chunks_deleted', 0):>8} "
+              f"{report.get('files_failed', 0):>7} {report.get('chunks_per_second', 0.0):>9}")
+        for failure in report.get("failures", []):
+            print(f"  {failure['stage']} failed for {failure['item']}: {failure['error']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest source files into the configured Chroma collections.")
+    parser.add_argument("collections", nargs="*", help="collection names from the config (default: all)")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH)
+    parser.add_argument("--files", nargs="+", default=None, help="ingest only these files; nothing is removed")
+    parser.add_argument("--source-directory", default=None, help="override the source directory of the collection")
+    parser.add_argument("--reingest", action="store_true", help="also re-ingest files that have not changed")
+    parser.add_argument("--dry-run", action="store_true", help="only print what would change")
+    parser.add_argument("--load-workers", type=int, default=None, help="processes extracting PDF/text files per collection (default: CPU count)")
+    parser.add_argument("--embedding-workers", type=int, default=4, help="threads calling the embeddings API per collection")
+    parser.add_argument("--parallel", type=int, default=1, help="collections ingested at the same time")
+    parser.add_argument("--stats", default=None, help="write the per-collection reports to this JSON file")
+    args = parser.parse_args(argv)
+
+    # Stored sources and config paths are relative to the application directory
+    files = [os.path.relpath(os.path.abspath(file_path), APPLICATION_DIRECTORY) for file_path in args.files] if args.files else None
+    config_path = os.path.abspath(args.config)
+    stats_path = os.path.abspath(args.stats) if args.stats else None
+    os.chdir(APPLICATION_DIRECTORY)
+
+    configs = load_collection_configs(config_path)
+    names = args.collections or list(configs)
+    unknown = [name for name in names if name not in configs]
+    if unknown:
+        parser.error(f"unknown collections {', '.join(unknown)}; {config_path} has {', '.join(configs)}")
+    if (args.files or args.source_directory) and len(names) != 1:
+        parser.error("--files and --source-directory need exactly one collection")
+    if args.source_directory:
+        configs[names[0]]["source_directory"] = os.path.relpath(os.path.abspath(args.source_directory), APPLICATION_DIRECTORY)
+
+    def run(name):
+        return ingest_collection(
+            name,
+            configs[name],
+            files=files,
+            reingest=args.reingest,
+            dry_run=args.dry_run,
+            load_workers=args.load_workers,
+            embedding_workers=args.embedding_workers
+        )
+
+    with ThreadPoolExecutor(max_workers=max(args.parallel, 1)) as pool:
+        reports = list(pool.map(run, names))
+
+    print_summary(reports)
+    if stats_path:
+        with open(stats_path, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+    return 1 if any(report.get("files_failed") or report.get("chunks_failed") for report in reports) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# Merges the English and Spanish Chroma collections into the single collection read when UNIFIED_INDEX_ENABLED=true.
+# Every chunk keeps its id, embedding, text and metadata and gains a "lang" field.
+# Run from the application directory:
+#   python scripts/merge_collections.py
+#   python scripts/merge_collections.py --flat-index
+
+import os
+import sys
+import argparse
+from langchain_community.vectorstores import Chroma
+
+# Add the application directory to the Python path to access managers
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from managers.flat_index import FlatIndex
+from managers.index_manifest import write_index_manifest
+from build_lexical_index import build_lexical_index
+
+def copy_collection(source_directory, lang, target, batch_size=500):
+    source = Chroma(persist_directory=source_directory)._collection
+    total = source.count()
+
+    for offset in range(0, total, batch_size):
+        batch = source.get(include=["embeddings", "documents", "metadatas"], limit=batch_size, offset=offset)
+        metadatas = [dict(metadata or {}, lang=lang) for metadata in batch["metadatas"]]
+        target.upsert(
+            ids=batch["ids"],
+            embeddings=batch["embeddings"],
+            documents=batch["documents"],
+            metadatas=metadatas
+        )
+        print(f"{source_directory}: copied {min(offset + batch_size, total)}/{total} chunks")
+
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the per-language Chroma collections into one collection tagged with lang.")
+    parser.add_argument("--english", default="docs/chroma/")
+    parser.add_argument("--spanish", default="docs/chroma/spanish")
+    parser.add_argument("--target", default="docs/chroma_unified/")
+    parser.add_argument("--flat-index", action="store_true", help="also export the partitioned flat index")
+    args = parser.parse_args()
+
+    db = Chroma(persist_directory=args.target)
+    count = copy_collection(args.english, "en", db._collection)
+    count += copy_collection(args.spanish, "es", db._collection)
+    print(f"Merged {count} chunks into {args.target}.")
+
+    build_lexical_index(args.target, db, partition_key="lang")
+    if args.flat_index:
+        directory = os.path.join(args.target, "flat_index")
+        exported = FlatIndex.export(db._collection, directory, partition_key="lang")
+        print(f"Exported {exported} chunks to {directory}.")
+    elif FlatIndex.refresh(db._collection, os.path.join(args.target, "flat_index")) is not None:
+        print(f"Refreshed the flat index under {args.target}.")
+    write_index_manifest(args.target, db._collection, changed_by="merge_collections.py")
+
+if __name__ == "__main__":
+    main()
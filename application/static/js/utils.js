@@ -373,23 +373,15 @@ function showReactions(message) {
     //Scroll to bottom script
     scrollToBottom();
 
-    // Define the URL of your Flask server
-    const apiUrl = `/chat_api`; // Replace with the actual URL if needed
+    // Streaming endpoint; the answer is displayed as it is generated
+    const apiUrl = `/chat_api_stream`;
 
     // Create a request body with the user query
     const requestBody = new FormData();
     requestBody.append('user_query', userQuery);
 
-    fetch(apiUrl, {
-        method: 'POST',
-        body: requestBody,
-      })
-      .then(response => response.json())
-      .then(botResponse => { 
-        // Display the bot's response in the chat
-        displayBotMessage(botResponse.resp, botResponse.msgID);
-        //typewriter(botResponse);
-
+    streamAPI(apiUrl, requestBody)
+      .then(() => {
         //Removing loading animation
         removeLoadingAnimation();
         $("#user_query").prop('disabled', false);
@@ -453,10 +445,10 @@ function showReactions(message) {
         callAPI('/chat_short_api');
         break;
       case 'detailedButton':
-        callAPI('/chat_detailed_api');
+        callAPI('/chat_detailed_api_stream');
         break;
       case 'actionItemsButton':
-        callAPI('/chat_actionItems_api');
+        callAPI('/chat_actionItems_api_stream');
         break;
       case 'sourcesButton':
         callAPI('/chat_sources_api');
@@ -470,12 +462,17 @@ function showReactions(message) {
     $('.followup-buttons').hide();
     displayLoadingAnimation();
     scrollToBottom();
-    fetch(apiUrl, {
+    // Endpoints ending in _stream send server-sent events
+    const request = apiUrl.endsWith('_stream') ?
+      streamAPI(apiUrl) :
+      fetch(apiUrl, {
         method: 'POST',
       })
       .then(response => response.json())
-      .then(botResponse => {
-        displayBotMessage(botResponse.resp, botResponse.msgID);
+      .then(botResponse => displayBotMessage(botResponse.resp, botResponse.msgID));
+
+    request
+      .then(() => {
         removeLoadingAnimation();
         $("#user_query").prop('disabled', false);
         $("#submit-button").prop('disabled', false);
@@ -492,6 +489,100 @@ function showReactions(message) {
   }
 
 
+  // Reads the server-sent events of a streaming endpoint, showing the answer
+  // while it is generated and replacing it with the final message when done
+  function streamAPI(apiUrl, requestBody) {
+    const options = {
+      method: 'POST'
+    };
+    if (requestBody) {
+      options.body = requestBody;
+    }
+    let streamedText = '';
+    let $streamingMessage = null;
+
+    return fetch(apiUrl, options).then(response => {
+      if (!response.ok || !response.body) {
+        throw new Error('Streaming request failed with status ' + response.status);
+      }
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      function handleEvent(event) {
+        if (event.type === 'delta') {
+          if ($streamingMessage === null) {
+            removeLoadingAnimation();
+            $streamingMessage = displayStreamingMessage();
+          }
+          streamedText += event.text;
+          $streamingMessage.find('.streaming-text').html(streamedText.replace(/\n/g, '<br>'));
+          scrollToBottom();
+        } else if (event.type === 'done') {
+          if ($streamingMessage !== null) {
+            $streamingMessage.remove();
+          }
+          displayBotMessage(event.resp, event.msgID, false);
+        } else if (event.type === 'error') {
+          // The answer could not be completed; replace any partial text with an error message
+          if ($streamingMessage === null) {
+            removeLoadingAnimation();
+            $streamingMessage = displayStreamingMessage();
+          }
+          streamedText = '';
+          $streamingMessage.removeClass('streaming-message');
+          $streamingMessage.find('.streaming-text').text('Sorry, something went wrong while answering. Please try again.');
+          scrollToBottom();
+        }
+      }
+
+      function read() {
+        return reader.read().then(({
+          done,
+          value
+        }) => {
+          if (done) {
+            return;
+          }
+          buffer += decoder.decode(value, {
+            stream: true
+          });
+          const events = buffer.split('\n\n');
+          buffer = events.pop();
+          events.forEach(rawEvent => {
+            if (rawEvent.startsWith('data: ')) {
+              handleEvent(JSON.parse(rawEvent.slice(6)));
+            }
+          });
+          return read();
+        });
+      }
+
+      return read();
+    });
+  }
+
+  // Placeholder bot message that receives the streamed text
+  function displayStreamingMessage() {
+    const chatHistory = document.getElementById('chatbot-prompt');
+    const botMessage = document.createElement('div');
+    botMessage.classList.add('card', 'left', 'streaming-message');
+    botMessage.innerHTML = `
+          <div class="card-body pb-0">
+            <div class="row">
+              <div class="col-xs-12 col-sm-12 col-md-2 col-lg-2 col-xl-2 col-2 d-flex flex-wrap align-items-top justify-content-center">
+                <img class="waterdrop1" />
+              </div>
+              <div class="col-xs-12 col-sm-12 col-md-10 col-lg-10 col-xl-10 col-10 bot-message-body">
+                <p class="m-0 streaming-text"></p>
+              </div>
+            </div>
+          </div>
+      `;
+    chatHistory.appendChild(botMessage);
+    return $(botMessage);
+  }
+
   function scrollToBottom() {
     $("#chatbot-prompt").scrollTop($('#chatbot-prompt')[0].scrollHeight - $('#chatbot-prompt')[0].clientHeight);
   }
@@ -573,7 +664,7 @@ chatHistory.appendChild(userMessage);
 }
 
  // Function to display a bot message in the chat interface
- function displayBotMessage(botResponse, messageID) {
+ function displayBotMessage(botResponse, messageID, animate = true) {
   const chatHistory = document.getElementById('chatbot-prompt');
   const botMessage = document.createElement('div');
   botMessage.classList.add('card', 'left');
@@ -681,5 +772,9 @@ chatHistory.appendChild(userMessage);
       </div>
     `;
   chatHistory.appendChild(botMessage);
-  messageInterval(botResponse, messageID)
+  if (animate) {
+    messageInterval(botResponse, messageID)
+  } else {
+    $("#botmessage-" + messageID).html(botResponse);
+  }
 }
\ No newline at end of file
@@ -210,10 +210,12 @@ class AppStack(Stack):
                 "OPENAI_API_KEY": ecs.Secret.from_secrets_manager(secret)
             },
             health_check=ecs.HealthCheck(
-                command=["CMD-SHELL", "curl -f http://localhost:8000/ || exit 1"],
+                # /ready returns 503 until startup warm-up has loaded the indexes and opened the LLM connections
+                command=["CMD-SHELL", "curl -f http://localhost:8000/ready || exit 1"],
                 interval=Duration.minutes(1),
                 timeout=Duration.seconds(5),
                 retries=3,
+                start_period=Duration.minutes(2),
             ),
             logging=ecs.LogDrivers.aws_logs(
                 stream_prefix=prefix_for_container_logs,
@@ -242,8 +244,9 @@ class AppStack(Stack):
             scale_out_cooldown=Duration.seconds(60),
         )
 
+        # Route traffic to a task only once it is warmed up
         ecs_service.target_group.configure_health_check(
-            path="/",
+            path="/ready",
             interval=Duration.minutes(1),
             timeout=Duration.seconds(5)
         )